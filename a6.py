@@ -1,5 +1,266 @@
-import math, os, pickle, re
-from typing import Tuple, List, Dict
+import contextlib, hashlib, itertools, logging, math, multiprocessing, os, pickle, re
+import string, struct, sys, time, zlib
+from array import array
+from collections import Counter, defaultdict
+from typing import Any, Callable, Tuple, List, Dict, Iterable, Iterator, Mapping, Optional
+from typing import Union
+
+from compact_model import CompactCounts, CompactModel
+from corpus_archive import CorpusArchive
+
+# a token is either a run of word characters (letters, digits, `'`, `_` and `-`), which
+# gets lowercased, or any other single non-whitespace character, which is kept as is
+_TOKEN_RE = re.compile(r"([a-zA-Z0-9'_-]+)|(\S)")
+_WORD_CHARS = string.ascii_letters + string.digits + "'_-"
+
+# nothing is printed by default, configure this logger (e.g. `logging.basicConfig`) to
+# see what the classifier is doing: loading, training and saving are logged at INFO,
+# progress of every shard of training files and scores of every text at DEBUG
+logger = logging.getLogger("a6")
+
+# header of a HashedBayesClassifier counts file: magic, bits and n-gram length, followed
+# by the uint32 positive and then negative counts, all little endian
+_HASHED_MAGIC = b"NBH1"
+_HASHED_HEADER = struct.Struct("<4sII")
+
+
+def _tokenize(text: str) -> List[str]:
+    """Splits given text into a list of the individual tokens in order, see
+    `BayesClassifier.tokenize`"""
+    return [word.lower() or punct for word, punct in _TOKEN_RE.findall(text)]
+
+
+def _label_of(filename: str, pos_prefix: str, neg_prefix: str) -> Optional[str]:
+    """Finds the label of a training file from its name
+
+    Returns:
+        "positive", "negative" or None if the file is neither
+    """
+    if filename.startswith(pos_prefix):
+        return "positive"
+    if filename.startswith(neg_prefix):
+        return "negative"
+    return None
+
+
+def _labelled(texts: Iterable[str], labels: Iterable[str]) -> List[Tuple[str, str]]:
+    """Pairs texts with their labels for `partial_fit`, checking all of them before
+    anything is learnt so invalid input leaves the classifier unchanged
+
+    Args:
+        texts - texts to learn from
+        labels - label of each text, either "positive" or "negative"
+
+    Returns:
+        list of (text, label) pairs
+
+    Raises:
+        ValueError when the lengths differ or a label is unknown
+    """
+    missing = object()
+    pairs = []
+    for text, label in itertools.zip_longest(texts, labels, fillvalue=missing):
+        if text is missing or label is missing:
+            raise ValueError("texts and labels must have the same length")
+        if label not in ("positive", "negative"):
+            raise ValueError(f"Unknown label {label!r}, expected positive/negative")
+        pairs.append((text, label))
+    return pairs  # type: ignore
+
+
+# a manifest entry records a training file as it was when its words were counted:
+# (size in bytes, modification time in ns, sha1 of its contents, "positive", "negative"
+# or None if it is neither); the frequencies of its words are kept apart, in the file
+# counts cache, as they are only needed when the file changes or is removed
+ManifestEntry = Tuple[int, int, str, Optional[str]]
+
+
+def _scan_files(
+    job: Tuple[str, List[str], str, str]
+) -> Tuple[List[Tuple[str, ManifestEntry, Dict[str, int]]], Dict[str, float]]:
+    """Fingerprints and counts the words of a shard of training files, possibly in a
+    worker process of `BayesClassifier.update_training`
+
+    Args:
+        job - (training directory, file names, positive prefix, negative prefix)
+
+    Returns:
+        list of (file name, manifest entry, dictionary of frequencies of its words) for
+        the files in the shard, and the seconds spent in each phase (io, tokenize and
+        count)
+    """
+    directory, filenames, pos_prefix, neg_prefix = job
+    entries = []
+    timings = {"io": 0.0, "tokenize": 0.0, "count": 0.0}
+    for filename in filenames:
+        start = time.perf_counter()
+        with open(os.path.join(directory, filename), "rb") as f:
+            data = f.read()
+            stat = os.fstat(f.fileno())
+        digest = hashlib.sha1(data).hexdigest()
+        read = time.perf_counter()
+        timings["io"] += read - start
+
+        label = _label_of(filename, pos_prefix, neg_prefix)
+        tokens = _tokenize(data.decode("utf8")) if label else []
+        tokenized = time.perf_counter()
+        timings["tokenize"] += tokenized - read
+
+        counts = dict(Counter(tokens))
+        entries.append(
+            (filename, (stat.st_size, stat.st_mtime_ns, digest, label), counts)
+        )
+        timings["count"] += time.perf_counter() - tokenized
+    return entries, timings
+
+
+def _count_archive(
+    job: Tuple[str, int, int]
+) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, float]]:
+    """Counts the words of a range of records of a corpus archive, possibly in a worker
+    process of `BayesClassifier.train_from_archive`
+
+    Args:
+        job - (corpus archive file name, index of first record, index after last record)
+
+    Returns:
+        (positive, negative) word frequencies of the records, and the seconds spent in
+        each phase (io, tokenize and count)
+    """
+    filepath, start, stop = job
+    pos_counts: Counter = Counter()
+    neg_counts: Counter = Counter()
+    timings = {"io": 0.0, "tokenize": 0.0, "count": 0.0}
+    archive = CorpusArchive(filepath)
+    for index in range(start, stop):
+        began = time.perf_counter()
+        _, label, text = archive[index]
+        read = time.perf_counter()
+        timings["io"] += read - began
+        if label is None:
+            continue
+
+        tokens = _tokenize(text)
+        tokenized = time.perf_counter()
+        timings["tokenize"] += tokenized - read
+        (pos_counts if label == "positive" else neg_counts).update(tokens)
+        timings["count"] += time.perf_counter() - tokenized
+    archive.close()
+    return dict(pos_counts), dict(neg_counts), timings
+
+
+def _bucket_log_probs(counts: array, total: int) -> array:
+    """Computes the add one smoothed log probability of every bucket of a
+    HashedBayesClassifier, log((count + 1) / total)
+
+    Args:
+        counts - frequencies of features by bucket
+        total - total count of features
+
+    Returns:
+        array of log probabilities by bucket
+    """
+    # most buckets share a handful of small counts, so each distinct count's log
+    # probability is only computed once
+    log_probs = {count: math.log((count + 1) / total) for count in set(counts)}
+    return array("d", map(log_probs.__getitem__, counts))
+
+
+class Metrics:
+    """Timers and counters of the work done by a BayesClassifier
+
+    Attributes:
+        timings - (phase -> total seconds spent in it) for the phases io, tokenize and
+            count of training files, persist (loading and saving), index and classify
+        counters - (name -> count), e.g. files_scanned, tokens_trained,
+            texts_classified, tokens_classified and unknown_tokens
+        hook - optional callback exporting the metrics, called with the name of an
+            event and a `snapshot` when it finishes: startup, train, or classify after
+            every `classify` call and every chunk of texts of `classify_many`
+    """
+
+    def __init__(self, hook: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.hook = hook
+
+    @contextlib.contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """Adds the time spent in the `with` block to given phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] += time.perf_counter() - start
+
+    def unknown_word_rate(self) -> float:
+        """Fraction of the classified tokens that weren't in the model"""
+        classified = self.counters.get("tokens_classified", 0)
+        return self.counters.get("unknown_tokens", 0) / classified if classified else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copies the current metrics
+
+        Returns:
+            dictionary of timings, counters and unknown word rate
+        """
+        return {
+            "timings": dict(self.timings),
+            "counters": dict(self.counters),
+            "unknown_word_rate": self.unknown_word_rate(),
+        }
+
+    def export(self, event: str) -> None:
+        """Hands a snapshot of the metrics to the hook, if there is one
+
+        Args:
+            event - name of the event that just finished
+        """
+        if self.hook is not None:
+            self.hook(event, self.snapshot())
+
+    def reset(self) -> None:
+        """Zeroes all timings and counters"""
+        self.timings.clear()
+        self.counters.clear()
+
+
+def _iter_classify_chunks(
+    texts: Iterable[str],
+    chunk_size: int,
+    metrics: Metrics,
+    ensure_index: Callable[[], None],
+    score_text: Callable[[str], Tuple[float, float]],
+) -> Iterator[Tuple[List[str], List[Tuple[float, float]]]]:
+    """Chunk loop of `iter_classify_many` of both classifiers
+
+    Args:
+        texts - texts to classify
+        chunk_size - maximum number of texts held in memory at a time
+        metrics - metrics of the classifier, timed under "classify"
+        ensure_index - builds the classifier's scoring index if it isn't built
+        score_text - gives the (positive, negative) log probability of a text
+
+    Returns:
+        generator over (labels, scores) of each chunk
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+    texts = iter(texts)
+    while True:
+        chunk = list(itertools.islice(texts, chunk_size))
+        if not chunk:
+            return
+        with metrics.timer("classify"):
+            ensure_index()
+            scores = [score_text(text) for text in chunk]
+            labels = [
+                "positive" if pos_prob > neg_prob else "negative"
+                for pos_prob, neg_prob in scores
+            ]
+        metrics.export("classify")
+        yield labels, scores
 
 
 class BayesClassifier:
@@ -13,13 +274,49 @@ class BayesClassifier:
         training_data_directory - relative path to training directory
         neg_file_prefix - prefix of negative reviews
         pos_file_prefix - prefix of positive reviews
+        manifest_filename - name of training manifest cache file, recording the files
+            counted in the frequency dictionaries and the sha1 of the cache files they
+            were saved to
+        file_counts_filename - name of cache file of the frequencies of the words of
+            each training file
+        manifest - dictionary of (training file name -> manifest entry) of the files
+            counted in the frequency dictionaries while `update_training` runs, None
+            otherwise
+        num_pos_words - total count of words in positive reviews
+        num_neg_words - total count of words in negative reviews
+        log_probs - scoring index of (word -> (positive, negative) log probability),
+            None until built from the frequency dictionaries (or a CompactModel)
+        unseen_log_probs - (positive, negative) log probability of unknown words
+        metrics - timers and counters of the work done by the classifier
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        model_filename: Optional[str] = None,
+        metrics_hook: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        pos_freqs: Optional[Dict[str, int]] = None,
+        neg_freqs: Optional[Dict[str, int]] = None,
+    ):
         """Constructor initializes and trains the Naive Bayes Sentiment Classifier. If a
-        cache of a trained classifier is stored in the current folder it is loaded,
+        cache of a trained classifier is stored in the current folder it is loaded and
+        brought up to date with the training directory (see `update_training`),
         otherwise the system will proceed through training.  Once constructed the
-        classifier is ready to classify input text."""
+        classifier is ready to classify input text.
+
+        Args:
+            model_filename - relative path to a compact model file (see
+                `compact_model.py`) to memory map instead of loading the cache; the
+                frequency dictionaries of such a classifier are read only
+            metrics_hook - optional callback exporting the classifier's metrics, see
+                `Metrics`
+            pos_freqs - dictionary of frequencies of positive words to use instead of
+                loading the cache or training (given together with `neg_freqs`); the
+                scoring index is then built on the first classification
+            neg_freqs - dictionary of frequencies of negative words, see `pos_freqs`
+        """
+        if (pos_freqs is None) != (neg_freqs is None):
+            raise ValueError("pos_freqs and neg_freqs must be given together")
+
         # initialize attributes
         self.pos_freqs: Dict[str, int] = {}
         self.neg_freqs: Dict[str, int] = {}
@@ -28,22 +325,138 @@ class BayesClassifier:
         self.training_data_directory: str = "movie_reviews/"
         self.neg_file_prefix: str = "movies-1"
         self.pos_file_prefix: str = "movies-5"
+        self.manifest_filename: str = "manifest.dat"
+        self.file_counts_filename: str = "file_counts.dat"
+        self.manifest: Optional[Dict[str, ManifestEntry]] = None
+        self._file_counts: Dict[str, Dict[str, int]] = {}
+        # sha1 of the (positive, negative) cache files the frequency dictionaries were
+        # loaded from or saved to, None if they were neither
+        self._cache_digests: Optional[Tuple[str, str]] = None
+        self.num_pos_words: int = 0
+        self.num_neg_words: int = 0
+        self.log_probs: Optional[Mapping[str, Tuple[float, float]]] = None
+        self.unseen_log_probs: Tuple[float, float] = (0.0, 0.0)
+        self.metrics = Metrics(metrics_hook)
+
+        # a compact model already is a scoring index, so there's nothing to build
+        if model_filename is not None:
+            logger.info("Mapping compact model from file: %s", model_filename)
+            with self.metrics.timer("persist"):
+                model = CompactModel(model_filename)
+            self.pos_freqs = model.pos_freqs  # type: ignore
+            self.neg_freqs = model.neg_freqs  # type: ignore
+            self.num_pos_words = model.num_pos_words
+            self.num_neg_words = model.num_neg_words
+            self.log_probs = model
+            self.unseen_log_probs = model.unseen_log_probs
+            self.metrics.export("startup")
+            return
+
+        # the caller already has the counts, e.g. of a cross-validation fold
+        if pos_freqs is not None and neg_freqs is not None:
+            self.pos_freqs = pos_freqs
+            self.neg_freqs = neg_freqs
+            self.metrics.export("startup")
+            return
 
         # check if both cached classifiers exist within the current directory
         if os.path.isfile(self.pos_filename) and os.path.isfile(self.neg_filename):
-            print("Data files found - loading to use cached values...")
-            self.pos_freqs = self.load_dict(self.pos_filename)
-            self.neg_freqs = self.load_dict(self.neg_filename)
+            logger.info("Data files found - loading to use cached values...")
+            self.pos_freqs, pos_digest = self._load_dict(self.pos_filename)
+            self.neg_freqs, neg_digest = self._load_dict(self.neg_filename)
+            self._cache_digests = (pos_digest, neg_digest)
+            record = self._read_manifest()
+            if record is not None and record["archive"] is not None:
+                logger.info("Cached values were trained from %s", record["archive"])
+            elif os.path.isdir(self.training_data_directory):
+                # with a manifest we know which training files the cache was built
+                # from, so only what changed in the training directory since has to be
+                # counted; without one the cache is rebuilt
+                self._update_training(record, 1, 256)
+            else:
+                logger.info("Training directory not found - using cached values as is")
         else:
-            print("Data files not found - running training...")
+            logger.info("Data files not found - running training...")
             self.train()
+        self.build_index()
+        self.metrics.export("startup")
 
-    def train(self) -> None:
-        """Trains the Naive Bayes Sentiment Classifier
+    def train(self, workers: int = 1, chunk_size: int = 256) -> None:
+        """Trains the Naive Bayes Sentiment Classifier from scratch
 
         Train here means generates `pos_freq/neg_freq` dictionaries with frequencies of
         words in corresponding positive/negative reviews
+
+        Args:
+            workers - number of worker processes counting words in parallel
+            chunk_size - number of files a worker counts per task
         """
+        self.pos_freqs = {}
+        self.neg_freqs = {}
+        self.log_probs = None
+        self._cache_digests = None
+        self._update_training(None, workers, chunk_size)
+
+    def update_training(self, workers: int = 1, chunk_size: int = 256) -> None:
+        """Brings the frequency dictionaries up to date with the training directory
+
+        Only files that are not in the manifest yet, or whose size, modification time
+        and then contents changed since, are read and tokenized. Their counts are added
+        to `pos_freqs/neg_freqs` (after subtracting the counts of the old version) and
+        the counts of files that were removed from the directory are subtracted. The
+        counts of each file are only loaded from the file counts cache if some file was
+        added, changed, touched or removed.
+
+        The manifest is only used if it was saved together with the frequency
+        dictionaries. Without it there's no telling which files they were counted from,
+        so they are counted again from scratch rather than adding every file on top.
+
+        If anything changed the dictionaries, the file counts and then the manifest are
+        saved, each to a temporary file that replaces the old one, so a crash part way
+        leaves a manifest that doesn't match the cache and the next update rebuilds it.
+
+        Args:
+            workers - number of worker processes counting words in parallel, with 1
+                (the default) the files are processed in this process
+            chunk_size - number of files a worker counts per task
+        """
+        self._update_training(self._read_manifest(), workers, chunk_size)
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Loads the manifest saved together with the frequency dictionaries
+
+        Returns:
+            dictionary with the sha1 of the cache files ("pos", "neg" and
+            "file_counts"), the corpus archive they were trained from or None
+            ("archive") and (training file name -> manifest entry) ("files"), or None if
+            there's no manifest or it belongs to other cache files
+        """
+        if not os.path.isfile(self.manifest_filename):
+            return None
+        record = self.load_dict(self.manifest_filename)
+        if (record.get("pos"), record.get("neg")) != self._cache_digests:
+            logger.warning("Manifest doesn't match the cached values, ignoring it")
+            return None
+        return record
+
+    def _update_training(
+        self, record: Optional[Dict[str, Any]], workers: int, chunk_size: int
+    ) -> None:
+        """Does the work of `update_training`
+
+        Args:
+            record - manifest saved together with the frequency dictionaries, see
+                `_read_manifest`
+            workers - number of worker processes counting words in parallel
+            chunk_size - number of files a worker counts per task
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        self._check_writable(self.pos_freqs)
+        self._check_writable(self.neg_freqs)
+
         # get the list of file names from the training data directory
         # os.walk returns a generator (feel free to Google "python generators" if you're
         # curious to learn more, next gets the first value from this generator or the
@@ -52,68 +465,248 @@ class BayesClassifier:
         if not files:
             raise RuntimeError(f"Couldn't find path {self.training_data_directory}")
 
-        # print(files)
-        # print(len(files))
-        # files now holds a list of the filenames
-        # self.training_data_directory holds the folder name where these files are
-        
-
-        # stored below is how you would load a file with filename given by `fName`
-        # fName = files[0]
-        # print(fName)
-        # `text` here will be the literal text of the file (i.e. what you would see
-        # if you opened the file in a text editor
-        # text = self.load_file(os.path.join(self.training_data_directory, fName))
-
-
-        # *Tip:* training can take a while, to make it more transparent, we can use the
-        # enumerate function, which loops over something and has an automatic counter.
-        # write something like this to track progress (note the `# type: ignore` comment
-        # which tells mypy we know better and it shouldn't complain at us on this line):
-        for index, filename in enumerate(files, 1): # type: ignore
-            print("------------------------------------------")
-            print(f"Training {filename} on file {index} of {len(files)}")
-        #     <the rest of your code for updating frequencies here>
-            text = self.load_file(os.path.join(self.training_data_directory, filename))
-            print(text)
-
-        # we want to fill pos_freqs and neg_freqs with the correct counts of words from
-        # their respective reviews
-        
-        # for each file, if it is a negative file, update (see the Updating frequencies
-        # set of comments for what we mean by update) the frequencies in the negative
-        # frequency dictionary. If it is a positive file, update (again see the Updating
-        # frequencies set of comments for what we mean by update) the frequencies in the
-        # positive frequency dictionary. If it is neither a postive or negative file,
-        # ignore it and move to the next file (this is more just to be safe; we won't
-        # test your code with neutral reviews)
-        
-
-        # Updating frequences: to update the frequencies for each file, you need to get
-        # the text of the file, tokenize it, then update the appropriate dictionary for
-        # those tokens. We've asked you to write a function `update_dict` that will make
-        # your life easier here. Write that function first then pass it your list of
-        # tokens from the file and the appropriate dictionary
-            print(f"positive? {filename.startswith(self.pos_file_prefix)}")
-            print(f"negative? {filename.startswith(self.neg_file_prefix)}")
-            tokens = self.tokenize(text)
-            print(tokens)
-            
-            if filename.startswith(self.pos_file_prefix):
-                self.update_dict(tokens, self.pos_freqs)
-            elif filename.startswith(self.neg_file_prefix):
-                self.update_dict(tokens, self.neg_freqs)
-        # for debugging purposes, it might be useful to print out the tokens and their
-        # frequencies for both the positive and negative dictionaries
-        
-        # print(len(self.pos_freqs))
-        # print(len(self.neg_freqs))
+        self.manifest = {}
+        self._file_counts = {}
+        if record is not None and record["archive"] is None:
+            self.manifest = record["files"]
+        unmanaged = None
+        if not self.manifest and (self.pos_freqs or self.neg_freqs):
+            logger.warning("No manifest of the cached values - counting them again")
+            unmanaged = self._restart_training()
+
+        # a file whose size and modification time match the manifest is assumed to be
+        # unchanged, everything else has to be read again
+        stale = []
+        for filename in files:
+            entry = self.manifest.get(filename)
+            stat = os.stat(os.path.join(self.training_data_directory, filename))
+            if entry is None or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+                stale.append(filename)
+        removed = self.manifest.keys() - set(files)
+
+        if self.manifest and (stale or removed):
+            assert record is not None
+            try:
+                self._file_counts, digest = self._load_dict(self.file_counts_filename)
+            except FileNotFoundError:
+                digest = None
+            if digest != record["file_counts"]:
+                logger.warning("File counts don't match the manifest - counting again")
+                unmanaged = self._restart_training()
+                stale, removed = files, set()
+        self.metrics.counters["files_scanned"] += len(stale)
+        self.metrics.counters["files_unchanged"] += len(files) - len(stale)
+        self.metrics.counters["files_removed"] += len(removed)
+        for filename in removed:
+            self._forget_file(filename)
+
+        # map: the stale files are split into shards that are fingerprinted and counted,
+        # by a pool of worker processes when training in parallel, reduce: the counts
+        # of each shard are merged into ours as they come back (addition is
+        # commutative, so the order shards finish in doesn't change the result)
+        jobs = [
+            (
+                self.training_data_directory,
+                stale[start : start + chunk_size],
+                self.pos_file_prefix,
+                self.neg_file_prefix,
+            )
+            for start in range(0, len(stale), chunk_size)
+        ]
+        added = changed = 0
+        with contextlib.ExitStack() as stack:
+            if workers > 1 and len(jobs) > 1:
+                pool = stack.enter_context(multiprocessing.Pool(min(workers, len(jobs))))
+                shards: Iterable = pool.imap_unordered(_scan_files, jobs)
+            else:
+                shards = map(_scan_files, jobs)
+
+            for index, (entries, timings) in enumerate(shards, 1):
+                logger.debug("Counted shard %d of %d", index, len(jobs))
+                for phase, seconds in timings.items():
+                    self.metrics.timings[phase] += seconds
+                merge_start = time.perf_counter()
+                for filename, entry, counts in entries:
+                    old_entry = self.manifest.get(filename)
+                    if old_entry is not None and old_entry[2] == entry[2]:
+                        # only touched, the counts we have are still right
+                        self.manifest[filename] = entry
+                        continue
+                    if old_entry is None:
+                        added += 1
+                    else:
+                        self._forget_file(filename)
+                        changed += 1
+                    self.manifest[filename] = entry
+                    if counts:
+                        self._file_counts[filename] = counts
+                    self.metrics.counters["tokens_trained"] += sum(counts.values())
+                    if entry[3] == "positive":
+                        self.merge_dict(counts, self.pos_freqs)
+                    elif entry[3] == "negative":
+                        self.merge_dict(counts, self.neg_freqs)
+                self.metrics.timings["count"] += time.perf_counter() - merge_start
+
+        logger.info(
+            "Training data: %d new, %d changed, %d removed of %d files",
+            added,
+            changed,
+            len(removed),
+            len(files),
+        )
         # once you have gone through all the files, save the frequency dictionaries to
-        # avoid extra work in the future (using the save_dict method). The objects you
-        # are saving are self.pos_freqs and self.neg_freqs and the filepaths to save to
-        # are self.pos_filename and self.neg_filename
-        self.save_dict(self.pos_freqs, self.pos_filename)
-        self.save_dict(self.neg_freqs, self.neg_filename)
+        # avoid extra work in the future; the manifest goes last as it only counts as
+        # saved together with the dictionaries once it holds their sha1
+        # saved values that were counted again to the very same ones can stay as they are
+        recounted = unmanaged == (self.pos_freqs, self.neg_freqs)
+        if self._cache_digests is None or (
+            (added or changed or removed) and not recounted
+        ):
+            self._cache_digests = (
+                self._save_dict(self.pos_freqs, self.pos_filename),
+                self._save_dict(self.neg_freqs, self.neg_filename),
+            )
+        if stale or removed or unmanaged is not None:
+            if added or changed or removed:
+                file_counts_digest = self._save_dict(
+                    self._file_counts, self.file_counts_filename
+                )
+            else:
+                assert record is not None
+                file_counts_digest = record["file_counts"]
+            assert self._cache_digests is not None
+            self._save_dict(
+                {
+                    "pos": self._cache_digests[0],
+                    "neg": self._cache_digests[1],
+                    "file_counts": file_counts_digest,
+                    "archive": None,
+                    "files": self.manifest,
+                },
+                self.manifest_filename,
+            )
+        # the manifest and the counts of each file are only needed by the next update
+        self.manifest = None
+        self._file_counts = {}
+        self.metrics.export("train")
+
+    def _restart_training(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Empties the frequency dictionaries and the manifest to count every training
+        file again
+
+        Returns:
+            the (positive, negative) frequency dictionaries as they were
+        """
+        freqs = (self.pos_freqs, self.neg_freqs)
+        self.pos_freqs = {}
+        self.neg_freqs = {}
+        self.log_probs = None
+        self.manifest = {}
+        self._file_counts = {}
+        return freqs
+
+    def train_from_archive(
+        self, filepath: str, workers: int = 1, chunk_size: int = 2048
+    ) -> None:
+        """Trains the Naive Bayes Sentiment Classifier from scratch on a corpus archive
+        (see `corpus_archive.py`) instead of the training directory, reading the mapped
+        archive record by record rather than opening every review
+
+        The manifest records the archive instead of training files, so the next startup
+        loads the counts as they are rather than syncing them with the training
+        directory (which `update_training` then counts from scratch).
+
+        Args:
+            filepath - relative path to corpus archive
+            workers - number of worker processes counting words in parallel
+            chunk_size - number of records a worker counts per task
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be positive, got {workers}")
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+        archive = CorpusArchive(filepath)
+        num_records = len(archive)
+        archive.close()
+
+        self.pos_freqs = {}
+        self.neg_freqs = {}
+        self.log_probs = None
+        # every task maps the archive itself, so only record ranges are sent to workers
+        jobs = [
+            (filepath, start, min(start + chunk_size, num_records))
+            for start in range(0, num_records, chunk_size)
+        ]
+        with contextlib.ExitStack() as stack:
+            if workers > 1 and len(jobs) > 1:
+                pool = stack.enter_context(multiprocessing.Pool(min(workers, len(jobs))))
+                shards: Iterable = pool.imap_unordered(_count_archive, jobs)
+            else:
+                shards = map(_count_archive, jobs)
+
+            for index, (pos_counts, neg_counts, timings) in enumerate(shards, 1):
+                logger.debug("Counted shard %d of %d", index, len(jobs))
+                for phase, seconds in timings.items():
+                    self.metrics.timings[phase] += seconds
+                with self.metrics.timer("count"):
+                    self.merge_dict(pos_counts, self.pos_freqs)
+                    self.merge_dict(neg_counts, self.neg_freqs)
+                self.metrics.counters["tokens_trained"] += sum(pos_counts.values())
+                self.metrics.counters["tokens_trained"] += sum(neg_counts.values())
+        self.metrics.counters["records_scanned"] += num_records
+
+        logger.info("Training data: %d records of %s", num_records, filepath)
+        self._cache_digests = (
+            self._save_dict(self.pos_freqs, self.pos_filename),
+            self._save_dict(self.neg_freqs, self.neg_filename),
+        )
+        self._save_dict(
+            {
+                "pos": self._cache_digests[0],
+                "neg": self._cache_digests[1],
+                "file_counts": None,
+                "archive": filepath,
+                "files": {},
+            },
+            self.manifest_filename,
+        )
+        self.metrics.export("train")
+
+    def _forget_file(self, filename: str) -> None:
+        """Subtracts the counts of given training file from the frequency dictionaries
+        and drops it from the manifest, while `update_training` runs
+
+        Args:
+            filename - name of a file in the manifest
+        """
+        assert self.manifest is not None
+        label = self.manifest.pop(filename)[3]
+        counts = self._file_counts.pop(filename, {})
+        if label == "positive":
+            self.subtract_dict(counts, self.pos_freqs)
+        elif label == "negative":
+            self.subtract_dict(counts, self.neg_freqs)
+
+    def partial_fit(self, texts: Iterable[str], labels: Iterable[str]) -> None:
+        """Updates the classifier online with labelled texts, e.g. from a labelling
+        pipeline. These texts are not training files so they are not recorded in the
+        manifest; they can be persisted with `save_dict` on `pos_freqs/neg_freqs`, but
+        are dropped when the cache is next brought up to date with the training
+        directory, as it then no longer matches the manifest.
+
+        Args:
+            texts - texts to learn from
+            labels - label of each text, either "positive" or "negative"
+        """
+        self._check_writable(self.pos_freqs)
+        self._check_writable(self.neg_freqs)
+        for text, label in _labelled(texts, labels):
+            freqs = self.pos_freqs if label == "positive" else self.neg_freqs
+            tokens = self.tokenize(text)
+            self.update_dict(tokens, freqs)
+            self.metrics.counters["texts_fitted"] += 1
+            self.metrics.counters["tokens_trained"] += len(tokens)
 
     def classify(self, text: str) -> str:
         """Classifies given text as positive, negative or neutral from calculating the
@@ -125,50 +718,21 @@ class BayesClassifier:
         Returns:
             classification, either positive, negative or neutral
         """
-        # TODO: fill me out
-
-        
-        # get a list of the individual tokens that occur in text
-        tokens = self.tokenize(text)
-        # print(tokens)
+        with self.metrics.timer("classify"):
+            # get a list of the individual tokens that occur in text
+            tokens = self.tokenize(text)
 
-        # create some variables to store the positive and negative probability. since
-        # we will be adding logs of probabilities, the initial values for the positive
-        # and negative probabilities are set to 0
-        pos_prob = 0
-        neg_prob = 0
+            # the scoring index holds the log probabilities of every known word, so it
+            # only needs to be rebuilt after the frequency dictionaries change
+            if self.log_probs is None:
+                self.build_index()
+            pos_prob, neg_prob = self.score(tokens)
+        self.metrics.export("classify")
 
-        # get the sum of all of the frequencies of the features in each document class
-        # (i.e. how many words occurred in all documents for the given class) - this
-        # will be used in calculating the probability of each document class given each
-        # individual feature
-        num_pos_words = sum(self.pos_freqs.values())
-        num_neg_words = sum(self.neg_freqs.values())
-        # print(num_pos_words)
-        # print(num_neg_words)
-
-        # for each token in the text, calculate the probability of it occurring in a
-        # postive document and in a negative document and add the logs of those to the
-        # running sums. when calculating the probabilities, always add 1 to the numerator
-        # of each probability for add one smoothing (so that we never have a probability
-        # of 0)
-        for word in tokens:
-            num_pos_appearances = 1
-            if word in self.pos_freqs:
-                num_pos_appearances += self.pos_freqs[word]
-            # print(num_pos_appearances)
-            pos_prob += math.log(num_pos_appearances / num_pos_words)
-
-            num_neg_appearances = 1
-            if word in self.neg_freqs:
-                num_neg_appearances += self.neg_freqs[word]
-            # print(num_neg_appearances)
-            neg_prob += math.log(num_neg_appearances / num_neg_words)
-
-        # for debugging purposes, it may help to print the overall positive and negative
+        # for debugging purposes, it may help to log the overall positive and negative
         # probabilities
-        print(f"Positive Probability: {pos_prob}")
-        print(f"Negative Probability: {neg_prob}")
+        logger.debug("Positive Probability: %s", pos_prob)
+        logger.debug("Negative Probability: %s", neg_prob)
 
         # determine whether positive or negative was more probable (i.e. which one was
         # larger)
@@ -179,6 +743,114 @@ class BayesClassifier:
 
         # return a string of "positive" or "negative"
 
+    def classify_many(
+        self, texts: Iterable[str], chunk_size: int = 1024
+    ) -> Tuple[List[str], List[Tuple[float, float]]]:
+        """Classifies a batch of texts, giving the same labels as calling `classify`
+        on each of them but without printing anything
+
+        Args:
+            texts - texts to classify, any iterable (it is consumed in chunks)
+            chunk_size - number of texts scored at a time
+
+        Returns:
+            (labels, scores) where labels[i] is "positive" or "negative" and scores[i]
+            is the (positive, negative) log probability of texts[i]
+        """
+        labels: List[str] = []
+        scores: List[Tuple[float, float]] = []
+        for chunk_labels, chunk_scores in self.iter_classify_many(texts, chunk_size):
+            labels.extend(chunk_labels)
+            scores.extend(chunk_scores)
+        return labels, scores
+
+    def iter_classify_many(
+        self, texts: Iterable[str], chunk_size: int = 1024
+    ) -> Iterator[Tuple[List[str], List[Tuple[float, float]]]]:
+        """Lazily classifies texts in chunks of at most `chunk_size`, so an arbitrarily
+        long stream (e.g. lines of a file) is scored with bounded memory
+
+        Args:
+            texts - texts to classify
+            chunk_size - maximum number of texts held in memory at a time
+
+        Returns:
+            generator over (labels, scores) of each chunk, see `classify_many`
+        """
+        return _iter_classify_chunks(
+            texts,
+            chunk_size,
+            self.metrics,
+            self._ensure_index,
+            lambda text: self.score(self.tokenize(text)),
+        )
+
+    def _ensure_index(self) -> None:
+        """Builds the scoring index if it was dropped or never built"""
+        if self.log_probs is None:
+            self.build_index()
+
+    def build_index(self) -> None:
+        """Builds the scoring index from the current frequency dictionaries
+
+        For each known word the index stores the pair of add one smoothed log
+        probabilities of it occurring in a positive and in a negative document, i.e.
+        log((count + 1) / total words in class). Words missing from both dictionaries
+        share `unseen_log_probs`. `update_dict` drops the index whenever it changes
+        `pos_freqs` or `neg_freqs`; call this again after changing them any other way.
+        """
+        start = time.perf_counter()
+        self.num_pos_words = sum(self.pos_freqs.values())
+        self.num_neg_words = sum(self.neg_freqs.values())
+        unseen_pos = math.log(1 / self.num_pos_words)
+        unseen_neg = math.log(1 / self.num_neg_words)
+
+        log_probs: Dict[str, Tuple[float, float]] = {}
+        for word in self.pos_freqs.keys() | self.neg_freqs.keys():
+            pos_count = self.pos_freqs.get(word)
+            neg_count = self.neg_freqs.get(word)
+            log_probs[word] = (
+                unseen_pos
+                if pos_count is None
+                else math.log((pos_count + 1) / self.num_pos_words),
+                unseen_neg
+                if neg_count is None
+                else math.log((neg_count + 1) / self.num_neg_words),
+            )
+        self.log_probs = log_probs
+        self.unseen_log_probs = (unseen_pos, unseen_neg)
+        self.metrics.timings["index"] += time.perf_counter() - start
+
+    def score(self, tokens: Iterable[str]) -> Tuple[float, float]:
+        """Sums the positive and negative log probabilities of given tokens using the
+        scoring index (which must already be built, see `build_index`)
+
+        Args:
+            tokens - tokens to score
+
+        Returns:
+            (positive, negative) log probability of the tokens
+        """
+        log_probs = self.log_probs
+        unseen = self.unseen_log_probs
+        pos_prob = 0
+        neg_prob = 0
+        num_tokens = 0
+        num_unknown = 0
+        for word in tokens:
+            word_log_probs = log_probs.get(word, unseen)
+            if word_log_probs is unseen:
+                num_unknown += 1
+            pos_prob += word_log_probs[0]
+            neg_prob += word_log_probs[1]
+            num_tokens += 1
+
+        counters = self.metrics.counters
+        counters["texts_classified"] += 1
+        counters["tokens_classified"] += num_tokens
+        counters["unknown_tokens"] += num_unknown
+        return pos_prob, neg_prob
+
     def load_file(self, filepath: str) -> str:
         """Loads text of given file
 
@@ -198,9 +870,35 @@ class BayesClassifier:
             dict - a dictionary to pickle
             filepath - relative path to file to save
         """
-        print(f"Dictionary saved to file: {filepath}")
-        with open(filepath, "wb") as f:
-            pickle.Pickler(f).dump(dict)
+        self._save_dict(dict, filepath)
+
+    def _save_dict(self, dict: Dict, filepath: str) -> str:
+        """Pickles given dictionary to a temporary file that then replaces the file with
+        the given name, so the file holds either the old or the new dictionary even if
+        the process dies while saving
+
+        Args:
+            dict - a dictionary to pickle
+            filepath - relative path to file to save
+
+        Returns:
+            sha1 of the pickle saved
+        """
+        data = pickle.dumps(dict)
+        temp_filepath = f"{filepath}.{os.getpid()}.tmp"
+        with self.metrics.timer("persist"):
+            try:
+                with open(temp_filepath, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_filepath, filepath)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(temp_filepath)
+                raise
+        logger.info("Dictionary saved to file: %s", filepath)
+        return hashlib.sha1(data).hexdigest()
 
     def load_dict(self, filepath: str) -> Dict:
         """Loads pickled dictionary stored in given file
@@ -211,9 +909,21 @@ class BayesClassifier:
         Returns:
             dictionary stored in given file
         """
-        print(f"Loading dictionary from file: {filepath}")
-        with open(filepath, "rb") as f:
-            return pickle.Unpickler(f).load()
+        return self._load_dict(filepath)[0]
+
+    def _load_dict(self, filepath: str) -> Tuple[Dict, str]:
+        """Loads pickled dictionary stored in given file
+
+        Args:
+            filepath - relative path to file to load
+
+        Returns:
+            dictionary stored in given file and sha1 of the file
+        """
+        logger.info("Loading dictionary from file: %s", filepath)
+        with self.metrics.timer("persist"), open(filepath, "rb") as f:
+            data = f.read()
+            return pickle.loads(data), hashlib.sha1(data).hexdigest()
 
     def tokenize(self, text: str) -> List[str]:
         """Splits given text into a list of the individual tokens in order
@@ -224,26 +934,54 @@ class BayesClassifier:
         Returns:
             tokens of given text in order
         """
-        tokens = []
-        token = ""
-        for c in text:
-            if (
-                re.match("[a-zA-Z0-9]", str(c)) != None
-                or c == "'"
-                or c == "_"
-                or c == "-"
-            ):
-                token += c
-            else:
-                if token != "":
-                    tokens.append(token.lower())
-                    token = ""
-                if c.strip() != "":
-                    tokens.append(str(c.strip()))
+        return _tokenize(text)
 
-        if token != "":
-            tokens.append(token.lower())
-        return tokens
+    def iter_tokens(self, text: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Lazily yields the tokens of given text in order, producing exactly the same
+        stream as `tokenize` without building the full list
+
+        Args:
+            text - text to tokenize, either a single string or an iterable of string
+                chunks (e.g. an open file); a word split across two chunks is joined
+                back together before it is yielded
+
+        Returns:
+            generator over the tokens of given text in order
+        """
+        chunks = (text,) if isinstance(text, str) else text
+        carry: List[str] = []
+        for chunk in chunks:
+            # a word touching the end of the chunk may continue in the next one, so
+            # hold it back until we see what follows it (found by scanning back from
+            # the end, a regex search for it would retry from every position)
+            head = chunk.rstrip(_WORD_CHARS)
+            if head == "":
+                carry.append(chunk)
+                continue
+            tail = chunk[len(head) :]
+            if carry:
+                head = "".join(carry) + head
+            carry = [tail] if tail else []
+            for match in _TOKEN_RE.finditer(head):
+                word = match.group(1)
+                yield word.lower() if word else match.group(2)
+
+        word = "".join(carry)
+        if word != "":
+            yield word.lower()
+
+    def _check_writable(self, freqs: Mapping[str, int]) -> None:
+        """Raises if given frequency dictionary is a read only view of a mapped compact
+        model, before anything about the classifier has been changed
+
+        Args:
+            freqs - dictionary of frequencies about to be updated
+        """
+        if isinstance(freqs, CompactCounts):
+            raise RuntimeError(
+                "the frequency dictionaries of a classifier mapping a compact model are "
+                "read only, train a classifier from pos.dat/neg.dat to update them"
+            )
 
     def update_dict(self, words: List[str], freqs: Dict[str, int]) -> None:
         """Updates given (word -> frequency) dictionary with given words list
@@ -257,15 +995,351 @@ class BayesClassifier:
             words - list of tokens to update frequencies of
             freqs - dictionary of frequencies to update
         """
-        # TODO: your work here
+        self._check_writable(freqs)
+        # the scoring index is computed from the class dictionaries, so it is stale as
+        # soon as one of them changes
+        if freqs is self.pos_freqs or freqs is self.neg_freqs:
+            self.log_probs = None
+
         for word in words:
             if word in freqs:
                 freqs[word] += 1
             else:
                 freqs[word] = 1
 
+    def merge_dict(self, counts: Dict[str, int], freqs: Dict[str, int]) -> None:
+        """Adds given (word -> count) dictionary into given (word -> frequency)
+        dictionary, e.g. the word counts of a batch of documents into `pos_freqs`
+
+        Args:
+            counts - dictionary of counts to add
+            freqs - dictionary of frequencies to update
+        """
+        self._check_writable(freqs)
+        if freqs is self.pos_freqs or freqs is self.neg_freqs:
+            self.log_probs = None
+
+        for word, count in counts.items():
+            freqs[word] = freqs.get(word, 0) + count
+
+    def subtract_dict(self, counts: Dict[str, int], freqs: Dict[str, int]) -> None:
+        """Subtracts given (word -> count) dictionary from given (word -> frequency)
+        dictionary, dropping words whose frequency reaches 0 so the result is the same as
+        if the counted words had never been added
+
+        Args:
+            counts - dictionary of counts to subtract
+            freqs - dictionary of frequencies to update
+        """
+        self._check_writable(freqs)
+        if freqs is self.pos_freqs or freqs is self.neg_freqs:
+            self.log_probs = None
+
+        for word, count in counts.items():
+            remaining = freqs.get(word, 0) - count
+            if remaining > 0:
+                freqs[word] = remaining
+            else:
+                freqs.pop(word, None)
+
+
+class HashedBayesClassifier:
+    """A Naive Bayes Sentiment Classifier over a fixed size, hashed feature space
+
+    Instead of a dictionary entry for every distinct token, each feature (every token
+    and, optionally, every run of up to `ngram` consecutive tokens) is hashed into one of
+    `num_buckets` counters per class. Memory is therefore fixed and known in advance
+    however large the training data gets, at the price of features sharing a counter
+    when their hashes collide.
+
+    Attributes:
+        bits - log2 of the number of buckets
+        ngram - longest run of consecutive tokens used as a feature, 1 for tokens only
+        num_buckets - number of counters per class
+        pos_counts - array of frequencies of features in positive reviews by bucket
+        neg_counts - array of frequencies of features in negative reviews by bucket
+        counts_filename - name of counts cache file
+        training_data_directory - relative path to training directory
+        neg_file_prefix - prefix of negative reviews
+        pos_file_prefix - prefix of positive reviews
+        num_pos_features - total count of features in positive reviews
+        num_neg_features - total count of features in negative reviews
+        pos_log_probs - array of positive log probabilities by bucket, None until built
+            from the counts
+        neg_log_probs - array of negative log probabilities by bucket, None until built
+            from the counts
+        metrics - timers and counters of the work done by the classifier
+    """
+
+    def __init__(
+        self,
+        bits: int = 18,
+        ngram: int = 1,
+        counts_filename: Optional[str] = None,
+        metrics_hook: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ):
+        """Constructor initializes the classifier and loads its counts from the cache
+        file, or trains it if there is none. Once constructed the classifier is ready to
+        classify input text.
+
+        Args:
+            bits - log2 of the number of buckets, e.g. 18 for 262144 counters per class
+            ngram - longest run of consecutive tokens used as a feature (1 to 3)
+            counts_filename - relative path to counts cache file, defaults to
+                `hashed-<bits>-<ngram>.dat`
+            metrics_hook - optional callback exporting the classifier's metrics, see
+                `Metrics`
+        """
+        if not 1 <= bits <= 30:
+            raise ValueError(f"bits must be between 1 and 30, got {bits}")
+        if not 1 <= ngram <= 3:
+            raise ValueError(f"ngram must be between 1 and 3, got {ngram}")
+
+        self.bits: int = bits
+        self.ngram: int = ngram
+        self.num_buckets: int = 1 << bits
+        self.pos_counts: array = array("I", [0]) * self.num_buckets
+        self.neg_counts: array = array("I", [0]) * self.num_buckets
+        self.counts_filename: str = counts_filename or f"hashed-{bits}-{ngram}.dat"
+        self.training_data_directory: str = "movie_reviews/"
+        self.neg_file_prefix: str = "movies-1"
+        self.pos_file_prefix: str = "movies-5"
+        self.num_pos_features: int = 0
+        self.num_neg_features: int = 0
+        self.pos_log_probs: Optional[array] = None
+        self.neg_log_probs: Optional[array] = None
+        self.metrics = Metrics(metrics_hook)
+
+        if os.path.isfile(self.counts_filename):
+            logger.info("Data file found - loading to use cached values...")
+            self.load_counts(self.counts_filename)
+        else:
+            logger.info("Data file not found - running training...")
+            self.train()
+        self.build_index()
+        self.metrics.export("startup")
+
+    def features(self, tokens: List[str]) -> List[int]:
+        """Hashes given tokens and their runs of up to `ngram` consecutive tokens into
+        buckets
+
+        Args:
+            tokens - tokens of a text in order
+
+        Returns:
+            bucket of each token, followed by the buckets of its n-grams
+        """
+        mask = self.num_buckets - 1
+        buckets = [zlib.crc32(token.encode("utf8")) & mask for token in tokens]
+        for n in range(2, self.ngram + 1):
+            # tokens never contain spaces, so n-grams can't hash like a single token
+            buckets.extend(
+                zlib.crc32(" ".join(tokens[start : start + n]).encode("utf8")) & mask
+                for start in range(len(tokens) - n + 1)
+            )
+        return buckets
+
+    def train(self) -> None:
+        """Trains the classifier from scratch on the training directory and saves the
+        counts"""
+        _, __, files = next(os.walk(self.training_data_directory), (None, None, []))
+        if not files:
+            raise RuntimeError(f"Couldn't find path {self.training_data_directory}")
+
+        self.pos_counts = array("I", [0]) * self.num_buckets
+        self.neg_counts = array("I", [0]) * self.num_buckets
+        self.pos_log_probs = self.neg_log_probs = None
+        for filename in files:
+            label = _label_of(filename, self.pos_file_prefix, self.neg_file_prefix)
+            if label is None:
+                continue
+            counts = self.pos_counts if label == "positive" else self.neg_counts
+            with self.metrics.timer("io"), open(
+                os.path.join(self.training_data_directory, filename),
+                "r",
+                encoding="utf8",
+            ) as f:
+                text = f.read()
+            with self.metrics.timer("tokenize"):
+                tokens = _tokenize(text)
+                buckets = self.features(tokens)
+            with self.metrics.timer("count"):
+                for bucket in buckets:
+                    counts[bucket] += 1
+            self.metrics.counters["files_scanned"] += 1
+            self.metrics.counters["tokens_trained"] += len(tokens)
+
+        logger.info("Training data: %d files", len(files))
+        self.save_counts(self.counts_filename)
+        self.metrics.export("train")
+
+    def partial_fit(self, texts: Iterable[str], labels: Iterable[str]) -> None:
+        """Updates the classifier online with labelled texts, see
+        `BayesClassifier.partial_fit`; call `save_counts` to persist them
+
+        Args:
+            texts - texts to learn from
+            labels - label of each text, either "positive" or "negative"
+        """
+        for text, label in _labelled(texts, labels):
+            counts = self.pos_counts if label == "positive" else self.neg_counts
+            tokens = _tokenize(text)
+            for bucket in self.features(tokens):
+                counts[bucket] += 1
+            self.pos_log_probs = self.neg_log_probs = None
+            self.metrics.counters["texts_fitted"] += 1
+            self.metrics.counters["tokens_trained"] += len(tokens)
+
+    def build_index(self) -> None:
+        """Computes the add one smoothed log probability of every bucket in each class,
+        log((count + 1) / total features in class)"""
+        with self.metrics.timer("index"):
+            self.num_pos_features = sum(self.pos_counts)
+            self.num_neg_features = sum(self.neg_counts)
+            self.pos_log_probs = _bucket_log_probs(self.pos_counts, self.num_pos_features)
+            self.neg_log_probs = _bucket_log_probs(self.neg_counts, self.num_neg_features)
+
+    def score(self, tokens: Iterable[str]) -> Tuple[float, float]:
+        """Sums the positive and negative log probabilities of the features of given
+        tokens (the log probabilities must already be built, see `build_index`)
+
+        Args:
+            tokens - tokens to score
+
+        Returns:
+            (positive, negative) log probability of the tokens
+        """
+        tokens = list(tokens)
+        buckets = self.features(tokens)
+        pos_log_probs = self.pos_log_probs
+        neg_log_probs = self.neg_log_probs
+        pos_prob = 0
+        neg_prob = 0
+        for bucket in buckets:
+            pos_prob += pos_log_probs[bucket]
+            neg_prob += neg_log_probs[bucket]
+
+        pos_counts = self.pos_counts
+        neg_counts = self.neg_counts
+        counters = self.metrics.counters
+        counters["texts_classified"] += 1
+        counters["tokens_classified"] += len(tokens)
+        counters["unknown_tokens"] += sum(
+            1
+            for bucket in buckets[: len(tokens)]
+            if not pos_counts[bucket] and not neg_counts[bucket]
+        )
+        return pos_prob, neg_prob
+
+    def classify(self, text: str) -> str:
+        """Classifies given text as positive or negative, see `BayesClassifier.classify`
+
+        Args:
+            text - text to classify
+
+        Returns:
+            classification, either positive or negative
+        """
+        with self.metrics.timer("classify"):
+            self._ensure_index()
+            pos_prob, neg_prob = self.score(_tokenize(text))
+        self.metrics.export("classify")
+
+        logger.debug("Positive Probability: %s", pos_prob)
+        logger.debug("Negative Probability: %s", neg_prob)
+        if pos_prob > neg_prob:
+            return "positive"
+        else:
+            return "negative"
+
+    def classify_many(
+        self, texts: Iterable[str], chunk_size: int = 1024
+    ) -> Tuple[List[str], List[Tuple[float, float]]]:
+        """Classifies a batch of texts, see `BayesClassifier.classify_many`
+
+        Args:
+            texts - texts to classify, any iterable (it is consumed in chunks)
+            chunk_size - number of texts scored at a time
+
+        Returns:
+            (labels, scores) where labels[i] is "positive" or "negative" and scores[i]
+            is the (positive, negative) log probability of texts[i]
+        """
+        labels: List[str] = []
+        scores: List[Tuple[float, float]] = []
+        for chunk_labels, chunk_scores in self.iter_classify_many(texts, chunk_size):
+            labels.extend(chunk_labels)
+            scores.extend(chunk_scores)
+        return labels, scores
+
+    def iter_classify_many(
+        self, texts: Iterable[str], chunk_size: int = 1024
+    ) -> Iterator[Tuple[List[str], List[Tuple[float, float]]]]:
+        """Lazily classifies texts in chunks of at most `chunk_size`, see
+        `BayesClassifier.iter_classify_many`
+
+        Args:
+            texts - texts to classify
+            chunk_size - maximum number of texts held in memory at a time
+
+        Returns:
+            generator over (labels, scores) of each chunk, see `classify_many`
+        """
+        return _iter_classify_chunks(
+            texts,
+            chunk_size,
+            self.metrics,
+            self._ensure_index,
+            lambda text: self.score(_tokenize(text)),
+        )
+
+    def _ensure_index(self) -> None:
+        """Builds the log probabilities if they were dropped or never built"""
+        if self.pos_log_probs is None or self.neg_log_probs is None:
+            self.build_index()
+
+    def save_counts(self, filepath: str) -> None:
+        """Saves the counts of both classes to a file
+
+        Args:
+            filepath - relative path to file to save
+        """
+        with self.metrics.timer("persist"), open(filepath, "wb") as f:
+            f.write(_HASHED_HEADER.pack(_HASHED_MAGIC, self.bits, self.ngram))
+            for counts in (self.pos_counts, self.neg_counts):
+                # arrays are written in native byte order, the file is little endian
+                if sys.byteorder != "little":
+                    counts = array("I", counts)
+                    counts.byteswap()
+                counts.tofile(f)
+        logger.info("Counts saved to file: %s", filepath)
+
+    def load_counts(self, filepath: str) -> None:
+        """Loads the counts of both classes saved by `save_counts`
+
+        Args:
+            filepath - relative path to file to load
+        """
+        logger.info("Loading counts from file: %s", filepath)
+        with self.metrics.timer("persist"), open(filepath, "rb") as f:
+            magic, bits, ngram = _HASHED_HEADER.unpack(f.read(_HASHED_HEADER.size))
+            if (magic, bits, ngram) != (_HASHED_MAGIC, self.bits, self.ngram):
+                raise ValueError(
+                    f"{filepath} doesn't hold counts of {self.bits} bits and "
+                    f"{self.ngram}-grams"
+                )
+            self.pos_counts = array("I")
+            self.pos_counts.fromfile(f, self.num_buckets)
+            self.neg_counts = array("I")
+            self.neg_counts.fromfile(f, self.num_buckets)
+        if sys.byteorder != "little":
+            self.pos_counts.byteswap()
+            self.neg_counts.byteswap()
+        self.pos_log_probs = self.neg_log_probs = None
+
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # uncomment the below lines once you've implemented `train` & `classify`
     b = BayesClassifier()
     a_list_of_words = ["I", "really", "like", "this", "movie", ".", "I", "hope", \
@@ -278,6 +1352,356 @@ if __name__ == "__main__":
     assert a_dictionary["too"] == 1, "update_dict test 4"
     print("update_dict tests passed.")
 
+    text = "Don't PANIC -- it's a well-known_fact, 42 times!\n\tÉtoile  ;)"
+    tokens = ["don't", "panic", "--", "it's", "a", "well-known_fact", ",", "42",
+              "times", "!", "É", "toile", ";", ")"]
+    assert b.tokenize(text) == tokens, "tokenize test 1"
+    assert list(b.iter_tokens(text)) == tokens, "tokenize test 2"
+    assert list(b.iter_tokens(["Don't PA", "NIC -", "- it's a well-", "known_fact,",
+                               " 42 times!\n\tÉtoile  ;)"])) == tokens, "tokenize test 3"
+    assert b.tokenize("") == [] and list(b.iter_tokens(["", ""])) == [], "tokenize test 4"
+
+    def _reference_tokenize(text: str) -> List[str]:
+        """The original character by character tokenizer `tokenize` replaced"""
+        tokens = []
+        token = ""
+        for c in text:
+            if (
+                re.match("[a-zA-Z0-9]", str(c)) != None
+                or c == "'"
+                or c == "_"
+                or c == "-"
+            ):
+                token += c
+            else:
+                if token != "":
+                    tokens.append(token.lower())
+                    token = ""
+                if c.strip() != "":
+                    tokens.append(str(c.strip()))
+
+        if token != "":
+            tokens.append(token.lower())
+        return tokens
+
+    # the compiled tokenizer must agree with the original on the whole corpus, also
+    # when the text is streamed in small chunks that split words
+    for filename in sorted(os.listdir(b.training_data_directory)):
+        text = b.load_file(os.path.join(b.training_data_directory, filename))
+        expected = _reference_tokenize(text)
+        assert b.tokenize(text) == expected, f"tokenize test 5 ({filename})"
+        assert list(b.iter_tokens(text)) == expected, f"tokenize test 6 ({filename})"
+        chunks = [text[i : i + 7] for i in range(0, len(text), 7)]
+        assert list(b.iter_tokens(chunks)) == expected, f"tokenize test 7 ({filename})"
+    print("tokenize tests passed.")
+
+    texts = ["I love computer science", "computer science is terrible"]
+    labels = [b.classify(text) for text in texts]
+    assert b.classify_many(texts) == (labels, [b.score(b.tokenize(t)) for t in texts]), \
+        "classify_many test 1"
+    assert b.classify_many(iter(texts * 3), chunk_size=2)[0] == labels * 3, \
+        "classify_many test 2"
+    assert b.classify_many([]) == ([], []), "classify_many test 3"
+    events: List[str] = []
+    b.metrics.hook = lambda event, snapshot: events.append(event)
+    b.classify(texts[0])
+    b.classify_many(texts * 3, chunk_size=2)
+    b.metrics.hook = None
+    assert events == ["classify"] * 4, "classify_many test 4"
+    print("classify_many tests passed.")
+
+    import shutil, tempfile
+
+    def _count_directory(directory: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Counts a training directory from scratch, to check incremental training"""
+        pos_counts: Counter = Counter()
+        neg_counts: Counter = Counter()
+        for filename in os.listdir(directory):
+            tokens = b.tokenize(b.load_file(os.path.join(directory, filename)))
+            if filename.startswith(b.pos_file_prefix):
+                pos_counts.update(tokens)
+            elif filename.startswith(b.neg_file_prefix):
+                neg_counts.update(tokens)
+        return dict(pos_counts), dict(neg_counts)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = os.path.join(scratch, "movie_reviews")
+        os.mkdir(directory)
+        for filename in sorted(os.listdir(b.training_data_directory))[::2000]:
+            shutil.copy(os.path.join(b.training_data_directory, filename), directory)
+        c = BayesClassifier(pos_freqs={}, neg_freqs={})
+        c.training_data_directory = directory
+        c.pos_filename = os.path.join(scratch, "pos.dat")
+        c.neg_filename = os.path.join(scratch, "neg.dat")
+        c.manifest_filename = os.path.join(scratch, "manifest.dat")
+        c.file_counts_filename = os.path.join(scratch, "file_counts.dat")
+
+        def _manifest_files() -> Dict[str, ManifestEntry]:
+            """Training files recorded in the saved manifest"""
+            return c.load_dict(c.manifest_filename)["files"]
+
+        c.update_training()
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), \
+            "update_training test 1"
+        # the parallel map-reduce must give exactly the tables of serial training
+        c.train(workers=2, chunk_size=2)
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), \
+            "train test (workers=2)"
+
+        with open(os.path.join(directory, "movies-5-new.txt"), "w") as f:
+            f.write("A zzqxplendid new review!")
+        with open(os.path.join(directory, "movies-1-new.txt"), "w") as f:
+            f.write("A zzqxdreadful new review.")
+        c.update_training()
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), \
+            "update_training test 2 (added)"
+        assert c.pos_freqs["zzqxplendid"] == 1 and len(_manifest_files()) == 9, \
+            "update_training test 3 (added)"
+
+        with open(os.path.join(directory, "movies-5-new.txt"), "w") as f:
+            f.write("A zzqxsuperb new review, changed.")
+        c.update_training()
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), \
+            "update_training test 4 (changed)"
+        assert "zzqxplendid" not in c.pos_freqs, "update_training test 5 (changed)"
+
+        manifest_entry = _manifest_files()["movies-1-new.txt"]
+        os.utime(os.path.join(directory, "movies-1-new.txt"), ns=(0, 0))
+        c.update_training()
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), \
+            "update_training test 6 (touched)"
+        assert _manifest_files()["movies-1-new.txt"][1] == 0 and \
+            _manifest_files()["movies-1-new.txt"][2:] == manifest_entry[2:], \
+            "update_training test 7 (touched)"
+
+        os.remove(os.path.join(directory, "movies-1-new.txt"))
+        c.update_training()
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), \
+            "update_training test 8 (removed)"
+        assert "zzqxdreadful" not in c.neg_freqs and len(_manifest_files()) == 8, \
+            "update_training test 9 (removed)"
+        assert c.load_dict(c.neg_filename) == c.neg_freqs and \
+            set(_manifest_files()) == set(os.listdir(directory)), "update_training test 10"
+        assert c.manifest is None, "update_training test 11"
+
+        # startup from the cache in the scratch directory: it has to match the training
+        # directory whether the manifest is there, belongs to other cache files (as
+        # after a crash while saving) or is missing (as in a fresh checkout)
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            d = BayesClassifier()
+            assert (d.pos_freqs, d.neg_freqs) == _count_directory(directory) and \
+                d.metrics.counters["files_scanned"] == 0, "startup test 1"
+            c.save_dict({word: 2 * count for word, count in c.pos_freqs.items()}, "pos.dat")
+            d = BayesClassifier()
+            assert (d.pos_freqs, d.neg_freqs) == _count_directory(directory), \
+                "startup test 2 (manifest of other cache files)"
+            with open("pos.dat", "rb") as f:
+                pos_data = f.read()
+            os.remove("manifest.dat")
+            d = BayesClassifier()
+            assert (d.pos_freqs, d.neg_freqs) == _count_directory(directory), \
+                "startup test 3 (no manifest)"
+            with open("pos.dat", "rb") as f:
+                assert f.read() == pos_data and os.path.isfile("manifest.dat"), \
+                    "startup test 4 (no manifest)"
+            os.remove("file_counts.dat")
+            os.remove(os.path.join(directory, "movies-5-new.txt"))
+            d = BayesClassifier()
+            assert (d.pos_freqs, d.neg_freqs) == _count_directory(directory), \
+                "startup test 5 (no file counts)"
+        finally:
+            os.chdir(cwd)
+
+        pos_count = c.pos_freqs.get("zzqxgreat", 0)
+        c.partial_fit(["zzqxgreat zzqxgreat", "zzqxawful"], ["positive", "negative"])
+        assert c.pos_freqs["zzqxgreat"] == pos_count + 2 and \
+            c.neg_freqs["zzqxawful"] == 1, "partial_fit test 1"
+        c.classify("zzqxgreat")
+        assert c.log_probs["zzqxgreat"][0] == math.log(3 / c.num_pos_words), \
+            "partial_fit test 2"
+        pos_freqs, neg_freqs = dict(c.pos_freqs), dict(c.neg_freqs)
+        for fit_texts, fit_labels in (
+            (["zzqxa", "zzqxb"], ["positive"]),
+            (["zzqxa", "zzqxb"], ["positive", "neutral"]),
+        ):
+            try:
+                c.partial_fit(fit_texts, fit_labels)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("partial_fit test 3")
+        assert (c.pos_freqs, c.neg_freqs) == (pos_freqs, neg_freqs), "partial_fit test 4"
+    print("update_training tests passed.")
+
+    from compact_model import write_compact_model
+
+    with tempfile.TemporaryDirectory() as scratch:
+        model_filename = os.path.join(scratch, "model.bin")
+        write_compact_model(b.pos_freqs, b.neg_freqs, model_filename)
+        c = BayesClassifier(model_filename)
+        model = c.log_probs
+        for update in (
+            lambda: c.partial_fit(["great"], ["positive"]),
+            lambda: c.update_dict(["great"], c.pos_freqs),
+            lambda: c.merge_dict({"great": 1}, c.neg_freqs),
+            lambda: c.subtract_dict({"great": 1}, c.neg_freqs),
+        ):
+            try:
+                update()
+            except RuntimeError:
+                pass
+            else:
+                raise AssertionError("compact model test 1")
+        assert c.log_probs is model and c.classify_many(texts) == b.classify_many(texts), \
+            "compact model test 2"
+        model.close()
+
+        from compact_model import compact
+
+        # pruned words are left out of the index and score as unknown words, the kept
+        # ones exactly as in the full model
+        compact(b.pos_freqs, b.neg_freqs, model_filename, min_count=2, top_k=1000)
+        c = BayesClassifier(model_filename)
+        assert len(c.log_probs) == 1000, "compact model test 3"
+        dropped = [word for word in sorted(b.log_probs)[::50] if word not in c.log_probs]
+        kept = [word for word in sorted(b.log_probs) if word in c.log_probs]
+        assert dropped and all(c.score([word]) == b.unseen_log_probs for word in dropped), \
+            "compact model test 4"
+        assert all(c.log_probs[word] == b.log_probs[word] for word in kept), \
+            "compact model test 5"
+        c.log_probs.close()
+
+        compact(b.pos_freqs, b.neg_freqs, model_filename, log_prob_bits=16)
+        c = BayesClassifier(model_filename)
+        assert all(
+            abs(c.log_probs[word][0] - b.log_probs[word][0]) < 1e-3
+            and abs(c.log_probs[word][1] - b.log_probs[word][1]) < 1e-3
+            for word in b.log_probs
+        ), "compact model test 6"
+        assert c.score(["zzqxunknown"]) == b.unseen_log_probs, "compact model test 7"
+        c.log_probs.close()
+
+        compact(b.pos_freqs, b.neg_freqs, model_filename, top_k=0)
+        c = BayesClassifier(model_filename)
+        assert len(c.log_probs) == 0 and c.score(["love"]) == b.unseen_log_probs, \
+            "compact model test 8"
+        assert c.classify_many(texts)[0] == ["negative", "negative"], "compact model test 9"
+        c.log_probs.close()
+    print("compact model tests passed.")
+
+    from corpus_archive import pack
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = os.path.join(scratch, "reviews")
+        os.mkdir(directory)
+        filenames = sorted(os.listdir(b.training_data_directory))[::4000]
+        for filename in filenames:
+            shutil.copy(os.path.join(b.training_data_directory, filename), directory)
+        archive_filename = os.path.join(scratch, "reviews.nbca")
+        assert pack(directory, archive_filename) == (len(filenames), 0), "archive test 1"
+
+        # a review that can't be decoded fails the append, which must leave the archive
+        # as it was
+        with open(os.path.join(directory, "movies-5-broken.txt"), "wb") as f:
+            f.write(b"caf\xe9")
+        size = os.path.getsize(archive_filename)
+        try:
+            pack(directory, archive_filename)
+        except UnicodeDecodeError:
+            pass
+        else:
+            raise AssertionError("archive test 2")
+        assert os.path.getsize(archive_filename) == size, "archive test 3"
+        assert len(CorpusArchive(archive_filename)) == len(filenames), "archive test 4"
+
+        os.remove(os.path.join(directory, "movies-5-broken.txt"))
+        with open(os.path.join(directory, "movies-1-new.txt"), "w") as f:
+            f.write("An appended review.")
+        assert pack(directory, archive_filename) == (1, len(filenames)), "archive test 5"
+        archive = CorpusArchive(archive_filename)
+        for name, label, text in archive:
+            expected_label = "negative" if name.startswith(b.neg_file_prefix) else (
+                "positive" if name.startswith(b.pos_file_prefix) else None)
+            assert label == expected_label and \
+                text == b.load_file(os.path.join(directory, name)), "archive test 6"
+        assert archive.names() == set(os.listdir(directory)), "archive test 7"
+        archive.close()
+
+        # an append cut short by a crash leaves records but no header pointing at them
+        with open(archive_filename, "ab") as f:
+            f.write(b"\x01\x05\x00half a record")
+        archive = CorpusArchive(archive_filename)
+        assert archive.names() == set(os.listdir(directory)), "archive test 8"
+        archive.close()
+
+        c = BayesClassifier(pos_freqs={}, neg_freqs={})
+        c.pos_filename = os.path.join(scratch, "pos.dat")
+        c.neg_filename = os.path.join(scratch, "neg.dat")
+        c.manifest_filename = os.path.join(scratch, "manifest.dat")
+        c.train_from_archive(archive_filename)
+        assert (c.pos_freqs, c.neg_freqs) == _count_directory(directory), "archive test 9"
+
+        # version 1 archives kept the index offset in a trailer and are still readable
+        v1_filename = os.path.join(scratch, "reviews-v1.nbca")
+        with open(v1_filename, "wb") as f:
+            f.write(struct.pack("<4sI", b"NBCA", 1))
+            f.write(struct.pack("<BHI", 1, 5, 4) + b"movie" + b"good")
+            # the index (offset 8 of the only record) at offset 24, then the trailer
+            f.write(struct.pack("<Q", 8) + struct.pack("<QQ4s", 24, 1, b"NBCI"))
+        archive = CorpusArchive(v1_filename)
+        assert archive.version == 1 and list(archive) == [("movie", "positive", "good")], \
+            "archive test 10"
+        archive.close()
+    print("corpus archive tests passed.")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.mkdir(os.path.join(scratch, "movie_reviews"))
+        for filename in sorted(os.listdir(b.training_data_directory))[::1000]:
+            shutil.copy(
+                os.path.join(b.training_data_directory, filename),
+                os.path.join(scratch, "movie_reviews"),
+            )
+        counts_filename = os.path.join(scratch, "hashed.dat")
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            h = HashedBayesClassifier(12, 2, counts_filename)
+        finally:
+            os.chdir(cwd)
+        assert os.path.isfile(counts_filename), "hashed test 1"
+
+        # loading the saved counts gives back the very same classifier
+        loaded = HashedBayesClassifier(12, 2, counts_filename)
+        assert (loaded.pos_counts, loaded.neg_counts) == (h.pos_counts, h.neg_counts), \
+            "hashed test 2"
+        assert loaded.classify_many(texts) == h.classify_many(texts), "hashed test 3"
+        for bits, ngram in ((13, 2), (12, 1)):
+            try:
+                HashedBayesClassifier(bits, ngram, counts_filename)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("hashed test 4")
+
+        bucket = h.features(["zzqxgreat"])[0]
+        pos_count, neg_count = h.pos_counts[bucket], h.neg_counts[bucket]
+        h.partial_fit(["zzqxgreat", "zzqxgreat zzqxgreat"], ["positive", "negative"])
+        assert (h.pos_counts[bucket], h.neg_counts[bucket]) == \
+            (pos_count + 1, neg_count + 2), "hashed test 5"
+        try:
+            h.partial_fit(["zzqxgreat", "zzqxgreat"], ["positive", "neutral"])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("hashed test 6")
+        assert h.pos_counts[bucket] == pos_count + 1, "hashed test 7"
+        labels, scores = h.classify_many(texts)
+        assert labels == [h.classify(text) for text in texts] and \
+            scores == [h.score(_tokenize(text)) for text in texts], "hashed test 8"
+    print("hashed classifier tests passed.")
+
     pos_denominator = sum(b.pos_freqs.values())
     neg_denominator = sum(b.neg_freqs.values())
 
@@ -327,7 +1751,7 @@ if __name__ == "__main__":
     print(b.classify("A classic film. John Carpenter's The Thing is one of the most entertaining horror films ever made - fast, clever and purely exciting from start to finish. It is one of my personal favorite horror movies. This is how all movies of the genre should be made. Set on an isolated base in Antarctica, this version seems almost to pick up where the original version (The Thing From Another World) left off. The American scientists discover a decimated Norwegian base some miles distant. Everyone is dead, and only the half charred remains of some unidentifiable thing left to smolder outside the compound might offer any answers to what may have happened. The Thing is brought back to the American base and, too late, the scientists realize that it is alive and lethal. The Thing thaws out and is off, not only killing anyone and anything that crosses Its path, but also absorbing them, making Itself into whoever and whatever it wants. The film then turns into a brilliant paranoia piece. Everyone is suspect, anyone can be The Thing, and no one trusts anyone anymore. Gone is the strength and security found when human beings band together in spite of their differences to battle a monster. The group splinters and fear rules supreme. Who is the Thing? Seriously I Love this movie I love it To Death. I love Escape From New York and I love Escape From L.A. but I also love The Thing so much better this is definitely the best Carpenter film a truly masterpiece classic I love R.J. MacReady - Kurt Russell I love everything about this film that is. Science Fiction, Horror and an Action Epic Film. A lot of the practical effects were left out but the it looked nice and the acting was good and it expanded upon the monsters background and showing you the inside of the ship. It must of been tough to bring across on screen the visual design. In my opinion, nobody has topped this film in the 25-odd years since its release. I'll put any of The Thing's old-school effects up against any CGI-driven movie, or this cast against almost any other ensemble. If you haven't seen the film yet, I envy you because I WISH I could see The Thing again for the first time. WOW! Does more need to be said? How about this...there is no parallel. Who's your friend? Who's the Thing? Who do you trust? Who can you afford to trust? If you've never seen this movie...your in for a treat. The only other movie that had such an impact on me was The Matrix (the first movie)...where I left the theater touching the walls wondering if they were really real. This movie will leaving you wondering....is the guy/gal next to you really real? Trust is a tough thing to come by these days. John Carpenter's The Thing is a seminal piece of horror that is not only a fine specimen of its era, but it also serves as a shining example of horror done absolutely right in any era. Combining gross-out special effects reminiscent of Hellraiser, the nail-bitingly intense, claustrophobic filmmaking of Alien, offering a story that is very well-paced, such as George A. Romero's Dawn of the Dead, and presenting the idea that true terror can be found at any time, in any place, and inside anyone, much like Alfred Hitchcock's Psycho, The Thing works on every level, and represents the peak of each and every aspect that may be utilized to make horror films effective. Granted, this amalgamation of styles is not the only formula for winning horror. The basic plot about this movie is Horror-moister John Carpenter (Halloween, Escape from New York) teams Kurt Russell's outstanding performance with incredible visuals to build this chilling version of the classic The Thing. In the winter of 1982, a twelve-man research team at a remote Antarctic research station discovers an alien buried in the snow for over 100,000 years. Once unfrozen, the form-changing alien wreaks havoc, creates terror and becomes one of them. It is one of the best favorite horror films of the 80's ever. I love this film to death. The Thing is the best classic horror film from master and genius John Carpenter! 'The Thing' is classic Carpenter and one of the few remakes that is better than the original. Kurt Russell's characters: Snake Plissken, R.J. MacReady and Jack Burton are Kurt's best favorite characters he ever played. I also love the music score from Ennio Morricone! Awesome!!! 10/10 Grade: Bad Ass Seal Of Approval"))
     print(b.classify("'American Psycho' is NOT a slasher movie. It is a depiction, a fantasy if you will, of the life of modern man and his place in society. Nothing is enough. Money, sex, social stature, there is always someone else who has more and everyone else expect from you to try harder for even more. This movie is about eliminating competition the easy way. By killing your opponents. By eating your sexual partners. By destroying everyone around you. 'American Psycho' retains the balance between this psychotic state, a chilling thriller and a very funny movie. The scenes that show Patrick playing music for his guests are absolutely hilarious, as he comments very seriously on records by artists such as Whitney Houston, Phil Collins and Huey Lewis & the News. The funny thing is that he chooses the most commercial or sold out records of these artists, to explain how much better they are compared to their previous, more artistic work. Another message of the state of the receivers of commercial art. You can analyze 'American Psycho' for hours. It can be perceived both as a deep and a fun movie. Even if you don't like the story, you will love Christian Bale's excellent performance. Enjoy."))
     print(b.classify("The idea was way too simple, just an angry and ruthless shark swimming around and eating defenceless people. When I was 6 I was really scared of it, bloody water and all those documentaries about sharks attacking people. But now I grew up and probably also grew out of flicks like this. It isn't even so funny now. It's just dull, boring and unwatchable. I don't know how a thinking person call it the best horror. It's just a clichéd thriller with some major flaws. Watch Alien - it's a true horror."))
-    print(b.classify("Okay, so bad acting, poor plot, cheap effects and cheesy photography are what make "the greatest horror movie of all time"? My 15 year old son said, "Well, maybe they liked it, because it's old". Yeah, either that, or Sam Raimi paid dozens of friends and family to vote for this clunker!!! Hey, it isn't a horrible movie: just dumb. I suppose if you're drunk, and have nothing better to do on a Saturday night, then rent this movie. Oh, in one of the "scary" moments of the film, my son said, "These people are dumb... they're retarded". The same might be said for anyone who actually believes this cinematic garbage is "essential viewing for a movie buff." (For "essential viewing, try "The Maltese Falcon" or "Amelie" or a film by Fellini or Bergman, if you want essential viewing... but NOT this sad waste of film!
+    print(b.classify('''Okay, so bad acting, poor plot, cheap effects and cheesy photography are what make "the greatest horror movie of all time"? My 15 year old son said, "Well, maybe they liked it, because it's old". Yeah, either that, or Sam Raimi paid dozens of friends and family to vote for this clunker!!! Hey, it isn't a horrible movie: just dumb. I suppose if you're drunk, and have nothing better to do on a Saturday night, then rent this movie. Oh, in one of the "scary" moments of the film, my son said, "These people are dumb... they're retarded". The same might be said for anyone who actually believes this cinematic garbage is "essential viewing for a movie buff." (For "essential viewing, try "The Maltese Falcon" or "Amelie" or a film by Fellini or Bergman, if you want essential viewing... but NOT this sad waste of film!
 
-One final note: the fact that so many folks on IMDb rated this film "10 stars" should be a red flag (suspicious sign, for those of you who have never heard the expression)-- Evidently, the average reviewer on this site is 1. uneducated 2. unsophisticated 3. under the age of sixteen 4. never seen a truly great film or 5. is a shill for the movie industry. I mean, ten stars should be reserved for a film in the top 100 greatest movies: not this sad little excuse for a story."))
+One final note: the fact that so many folks on IMDb rated this film "10 stars" should be a red flag (suspicious sign, for those of you who have never heard the expression)-- Evidently, the average reviewer on this site is 1. uneducated 2. unsophisticated 3. under the age of sixteen 4. never seen a truly great film or 5. is a shill for the movie industry. I mean, ten stars should be reserved for a film in the top 100 greatest movies: not this sad little excuse for a story.'''))
     pass
\ No newline at end of file
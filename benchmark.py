@@ -0,0 +1,528 @@
+"""Reproducible performance benchmarks of the BayesClassifier on the bundled corpus
+
+Measures tokenize throughput, end-to-end training time, startup time and memory of
+loading the cached model, and classify latency percentiles of short, medium and long
+reviews from `movie_reviews/`. Results are printed (or written with --output) as JSON,
+and with --baseline the run is compared against the JSON of an earlier run, exiting
+with status 1 if any metric regressed by more than its tolerance: --tolerance scaled
+by how noisy the metric is (tail percentiles are looser than medians), or the one
+given with --metric-tolerance.
+
+    python benchmark.py --output before.json
+    python benchmark.py --baseline before.json --tolerance 0.1
+    python benchmark.py --baseline before.json --metric-tolerance classify_long_p99=0.5
+"""
+import argparse, gc, itertools, json, os, platform, subprocess, sys
+import tempfile, time, tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from a6 import BayesClassifier
+
+# classify inputs are the corpus reviews whose size in bytes falls in these ranges
+LENGTH_BANDS = {"short": (1, 64), "medium": (128, 512), "long": (2048, 1 << 30)}
+
+
+# how many times --tolerance a metric may regress by, for metrics noisier than a median
+"""Reproducible performance benchmarks of the BayesClassifier on the bundled corpus
+
+Measures tokenize throughput, end-to-end training time, startup time and memory of
+loading the cached model, and classify latency percentiles of short, medium and long
+reviews from `movie_reviews/`. Results are printed (or written with --output) as JSON,
+and with --baseline the run is compared against the JSON of an earlier run, exiting
+with status 1 if any metric regressed by more than its tolerance: --tolerance scaled
+by how noisy the metric is (tail percentiles are looser than medians), or the one
+given with --metric-tolerance.
+
+    python benchmark.py --output before.json
+    python benchmark.py --baseline before.json --tolerance 0.1
+    python benchmark.py --baseline before.json --metric-tolerance classify_long_p99=0.5
+"""
+import argparse, gc, itertools, json, os, platform, subprocess, sys
+import tempfile, time, tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from a6 import BayesClassifier
+
+# classify inputs are the corpus reviews whose size in bytes falls in these ranges
+LENGTH_BANDS = {"short": (1, 64), "medium": (128, 512), "long": (2048, 1 << 30)}
+
+
+# how many times --tolerance a metric may regress by, for metrics noisier than a median
+TOLERANCE_SCALES = {"p90": 1.5, "p99": 2.0, "load_dict_time": 2.0, "startup_time": 2.0}
+
+
+def metric(value: float, unit: str, higher_is_better: bool = False) -> Dict[str, Any]:
+    """Packs a measurement with what is needed to compare it across runs"""
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def tolerance_scale(name: str) -> float:
+    """Factor of --tolerance allowed for the metric with given name"""
+    return max(
+        (scale for key, scale in TOLERANCE_SCALES.items() if key in name), default=1.0
+    )
+
+
+def parse_metric_tolerance(value: str) -> Tuple[str, float]:
+    """Parses a --metric-tolerance given as name=tolerance"""
+    name, _, tolerance = value.partition("=")
+    return name, float(tolerance)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest rank percentile of given samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def best_of(repeat: int, run: Callable[[], Any]) -> float:
+    """Runs given function `repeat` times and returns the fastest wall time in s"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def load_corpus(directory: str) -> Dict[str, str]:
+    """Loads every review of the corpus, keyed by file name in sorted order"""
+    corpus = {}
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), "r", encoding="utf8") as f:
+            corpus[filename] = f.read()
+    return corpus
+
+
+def bench_tokenize(
+    classifier: BayesClassifier, corpus: Dict[str, str], repeat: int
+) -> Dict[str, Any]:
+    """Throughput of tokenizing the whole corpus"""
+    texts = list(corpus.values())
+    megabytes = sum(len(text.encode("utf8")) for text in texts) / 1e6
+    seconds = best_of(repeat, lambda: [classifier.tokenize(text) for text in texts])
+    return {"tokenize_throughput": metric(megabytes / seconds, "MB/s", True)}
+
+
+def bench_train(directory: str, workers: List[int], repeat: int) -> Dict[str, Any]:
+    """End-to-end time of training from scratch on the corpus, for each worker count
+
+    The trained model is saved to a temporary directory so the cached one is left as is.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        classifier = BayesClassifier()
+        classifier.training_data_directory = directory
+        classifier.pos_filename = os.path.join(scratch, "pos.dat")
+        classifier.neg_filename = os.path.join(scratch, "neg.dat")
+        classifier.manifest_filename = os.path.join(scratch, "manifest.dat")
+        classifier.file_counts_filename = os.path.join(scratch, "file_counts.dat")
+        for count in workers:
+            seconds = best_of(repeat, lambda: classifier.train(workers=count))
+            results[f"train_time_workers_{count}"] = metric(seconds, "s")
+    return results
+
+
+def bench_load(repeat: int) -> Dict[str, Any]:
+    """Startup time of a classifier from the cached model and the Python memory it
+    holds afterwards"""
+    classifier = BayesClassifier()
+    load_seconds = best_of(
+        repeat,
+        lambda: (
+            classifier.load_dict(classifier.pos_filename),
+            classifier.load_dict(classifier.neg_filename),
+        ),
+    )
+    startup_seconds = best_of(repeat, BayesClassifier)
+
+    tracemalloc.start()
+    classifier = BayesClassifier()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "load_dict_time": metric(load_seconds * 1000, "ms"),
+        "startup_time": metric(startup_seconds * 1000, "ms"),
+        "startup_memory": metric(current / 2**20, "MiB"),
+        "startup_peak_memory": metric(peak / 2**20, "MiB"),
+    }
+
+
+def bench_classify(
+    classifier: BayesClassifier, corpus: Dict[str, str], samples: int, repeat: int
+) -> Dict[str, Any]:
+    """Latency percentiles of classify on reviews of each length band
+
+    Every band is classified once untimed to warm up, then `repeat` times with the
+    garbage collector off. Each percentile is the best of the ones of every repeat,
+    like `best_of`, so a repeat slowed down by other work on the host doesn't move it.
+    Bands with fewer than `samples` reviews are cycled through to still take `samples`
+    latencies per repeat.
+    """
+    results = {}
+    for band, (low, high) in LENGTH_BANDS.items():
+        texts = [
+            text for text in corpus.values() if low <= len(text.encode("utf8")) < high
+        ]
+        texts = texts[:: max(1, len(texts) // samples)][:samples]
+        texts = list(itertools.islice(itertools.cycle(texts), samples))
+        for text in texts:
+            classifier.classify(text)
+
+        percentiles: Dict[int, List[float]] = {50: [], 90: [], 99: []}
+        for _ in range(repeat):
+            latencies = []
+            gc.collect()
+            gc.disable()
+            try:
+                for text in texts:
+                    start = time.perf_counter()
+                    classifier.classify(text)
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+            for p, values in percentiles.items():
+                values.append(percentile(latencies, p / 100))
+        for p, values in percentiles.items():
+            results[f"classify_{band}_p{p}"] = metric(min(values) * 1e6, "us")
+    return results
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float,
+    metric_tolerances: Dict[str, float],
+) -> List[str]:
+    """Finds the metrics that got worse than the baseline by more than their tolerance
+
+    Args:
+        results - metrics of this run
+        baseline - metrics of an earlier run
+        tolerance - allowed relative change, e.g. 0.1 for 10%, scaled by
+            `tolerance_scale` of each metric
+        metric_tolerances - (metric name -> allowed relative change) overriding the
+            scaled tolerance
+
+    Returns:
+        description of every regression
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["higher_is_better"]:
+            change = -change
+        allowed = metric_tolerances.get(name, tolerance * tolerance_scale(name))
+        if change > allowed:
+            regressions.append(
+                f"{name}: {previous['value']:.4g} -> {current['value']:.4g} "
+                f"{current['unit']} ({change:+.1%} worse)"
+            )
+    return regressions
+
+
+def main(args: argparse.Namespace) -> int:
+    """Runs the benchmarks and reports them, returns the exit status"""
+    classifier = BayesClassifier()
+    corpus = load_corpus(args.corpus)
+
+    results: Dict[str, Any] = {}
+    results.update(bench_tokenize(classifier, corpus, args.repeat))
+    if not args.skip_train:
+        results.update(bench_train(args.corpus, args.workers, args.repeat))
+    results.update(bench_load(args.repeat))
+    results.update(bench_classify(classifier, corpus, args.samples, args.repeat))
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    ).stdout.strip()
+    report = {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(
+            results, baseline, args.tolerance, dict(args.metric_tolerance)
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="movie_reviews/", help="training directory")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark")
+    parser.add_argument(
+        "--samples", type=int, default=500, help="reviews per classify length band"
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1], help="train worker counts"
+    )
+    parser.add_argument("--skip-train", action="store_true", help="skip training")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="allowed relative regression"
+    )
+    parser.add_argument(
+        "--metric-tolerance", type=parse_metric_tolerance, action="append", default=[],
+        help="allowed relative regression of one metric as name=tolerance, may be "
+        "repeated",
+    )
+    sys.exit(main(parser.parse_args()))
+
+
+
+def metric(value: float, unit: str, higher_is_better: bool = False) -> Dict[str, Any]:
+    """Packs a measurement with what is needed to compare it across runs"""
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def tolerance_scale(name: str) -> float:
+    """Factor of --tolerance allowed for the metric with given name"""
+    return max(
+        (scale for key, scale in TOLERANCE_SCALES.items() if key in name), default=1.0
+    )
+
+
+def parse_metric_tolerance(value: str) -> Tuple[str, float]:
+    """Parses a --metric-tolerance given as name=tolerance"""
+    name, _, tolerance = value.partition("=")
+    return name, float(tolerance)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest rank percentile of given samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def best_of(repeat: int, run: Callable[[], Any]) -> float:
+    """Runs given function `repeat` times and returns the fastest wall time in s"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def load_corpus(directory: str) -> Dict[str, str]:
+    """Loads every review of the corpus, keyed by file name in sorted order"""
+    corpus = {}
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), "r", encoding="utf8") as f:
+            corpus[filename] = f.read()
+    return corpus
+
+
+def bench_tokenize(
+    classifier: BayesClassifier, corpus: Dict[str, str], repeat: int
+) -> Dict[str, Any]:
+    """Throughput of tokenizing the whole corpus"""
+    texts = list(corpus.values())
+    megabytes = sum(len(text.encode("utf8")) for text in texts) / 1e6
+    seconds = best_of(repeat, lambda: [classifier.tokenize(text) for text in texts])
+    return {"tokenize_throughput": metric(megabytes / seconds, "MB/s", True)}
+
+
+def bench_train(directory: str, workers: List[int], repeat: int) -> Dict[str, Any]:
+    """End-to-end time of training from scratch on the corpus, for each worker count
+
+    The trained model is saved to a temporary directory so the cached one is left as is.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        classifier = BayesClassifier()
+        classifier.training_data_directory = directory
+        classifier.pos_filename = os.path.join(scratch, "pos.dat")
+        classifier.neg_filename = os.path.join(scratch, "neg.dat")
+        classifier.manifest_filename = os.path.join(scratch, "manifest.dat")
+        classifier.file_counts_filename = os.path.join(scratch, "file_counts.dat")
+        for count in workers:
+            seconds = best_of(repeat, lambda: classifier.train(workers=count))
+            results[f"train_time_workers_{count}"] = metric(seconds, "s")
+    return results
+
+
+def bench_load(repeat: int) -> Dict[str, Any]:
+    """Startup time of a classifier from the cached model and the Python memory it
+    holds afterwards"""
+    classifier = BayesClassifier()
+    load_seconds = best_of(
+        repeat,
+        lambda: (
+            classifier.load_dict(classifier.pos_filename),
+            classifier.load_dict(classifier.neg_filename),
+        ),
+    )
+    startup_seconds = best_of(repeat, BayesClassifier)
+
+    tracemalloc.start()
+    classifier = BayesClassifier()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "load_dict_time": metric(load_seconds * 1000, "ms"),
+        "startup_time": metric(startup_seconds * 1000, "ms"),
+        "startup_memory": metric(current / 2**20, "MiB"),
+        "startup_peak_memory": metric(peak / 2**20, "MiB"),
+    }
+
+
+def bench_classify(
+    classifier: BayesClassifier, corpus: Dict[str, str], samples: int, repeat: int
+) -> Dict[str, Any]:
+    """Latency percentiles of classify on reviews of each length band
+
+    Every band is classified once untimed to warm up, then `repeat` times with the
+    garbage collector off. Each percentile is the best of the ones of every repeat,
+    like `best_of`, so a repeat slowed down by other work on the host doesn't move it.
+    Bands with fewer than `samples` reviews are cycled through to still take `samples`
+    latencies per repeat.
+    """
+    results = {}
+    for band, (low, high) in LENGTH_BANDS.items():
+        texts = [
+            text for text in corpus.values() if low <= len(text.encode("utf8")) < high
+        ]
+        texts = texts[:: max(1, len(texts) // samples)][:samples]
+        texts = list(itertools.islice(itertools.cycle(texts), samples))
+        for text in texts:
+            classifier.classify(text)
+
+        percentiles: Dict[int, List[float]] = {50: [], 90: [], 99: []}
+        for _ in range(repeat):
+            latencies = []
+            gc.collect()
+            gc.disable()
+            try:
+                for text in texts:
+                    start = time.perf_counter()
+                    classifier.classify(text)
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+            for p, values in percentiles.items():
+                values.append(percentile(latencies, p / 100))
+        for p, values in percentiles.items():
+            results[f"classify_{band}_p{p}"] = metric(min(values) * 1e6, "us")
+    return results
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float,
+    metric_tolerances: Dict[str, float],
+) -> List[str]:
+    """Finds the metrics that got worse than the baseline by more than their tolerance
+
+    Args:
+        results - metrics of this run
+        baseline - metrics of an earlier run
+        tolerance - allowed relative change, e.g. 0.1 for 10%, scaled by
+            `tolerance_scale` of each metric
+        metric_tolerances - (metric name -> allowed relative change) overriding the
+            scaled tolerance
+
+    Returns:
+        description of every regression
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["higher_is_better"]:
+            change = -change
+        allowed = metric_tolerances.get(name, tolerance * tolerance_scale(name))
+        if change > allowed:
+            regressions.append(
+                f"{name}: {previous['value']:.4g} -> {current['value']:.4g} "
+                f"{current['unit']} ({change:+.1%} worse)"
+            )
+    return regressions
+
+
+def main(args: argparse.Namespace) -> int:
+    """Runs the benchmarks and reports them, returns the exit status"""
+    classifier = BayesClassifier()
+    corpus = load_corpus(args.corpus)
+
+    results: Dict[str, Any] = {}
+    results.update(bench_tokenize(classifier, corpus, args.repeat))
+    if not args.skip_train:
+        results.update(bench_train(args.corpus, args.workers, args.repeat))
+    results.update(bench_load(args.repeat))
+    results.update(bench_classify(classifier, corpus, args.samples, args.repeat))
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    ).stdout.strip()
+    report = {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(
+            results, baseline, args.tolerance, dict(args.metric_tolerance)
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="movie_reviews/", help="training directory")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark")
+    parser.add_argument(
+        "--samples", type=int, default=500, help="reviews per classify length band"
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1], help="train worker counts"
+    )
+    parser.add_argument("--skip-train", action="store_true", help="skip training")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="allowed relative regression"
+    )
+    parser.add_argument(
+        "--metric-tolerance", type=parse_metric_tolerance, action="append", default=[],
+        help="allowed relative regression of one metric as name=tolerance, may be "
+        "repeated",
+    )
+    sys.exit(main(parser.parse_args()))
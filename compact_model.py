@@ -0,0 +1,604 @@
+"""Compact, memory mapped on-disk format for a trained BayesClassifier
+
+A compact model file holds the whole model in flat arrays, so it can be `mmap`ed and
+used without deserializing anything: processes mapping the same file share its pages,
+and words are looked up directly in the mapped buffers. Layout (little endian, every
+section starts 8-byte aligned; the mapped arrays are read in native byte order, so a
+compact model can only be mapped on a little endian machine):
+
+    header      magic, version, number of words, number of hash slots, total positive
+                words, total negative words, type of log_probs, type of counts, scale
+                and minimum of quantized log probabilities
+    log_probs   (positive, negative) add one smoothed log probability per word, float64
+                or quantized to uint16 / uint8 as minimum + scale * value
+    pos_counts  frequency of each word in positive reviews, the narrowest of uint8,
+                uint16 and uint32 holding the largest count
+    neg_counts  frequency of each word in negative reviews, same type as pos_counts
+    offsets     uint32 start of each word in `strings` (plus the end of the last one)
+    slots       int32 open addressing hash table (crc32, linear probing) of word ids,
+                -1 for empty slots
+    strings     utf-8 encoded words, sorted and concatenated
+
+A model can also be compacted on the way: words seen fewer than --min-count times are
+dropped, and only the --top-k most informative ones are kept (every one with --top-k
+all, the default, none with --top-k 0). The totals of the full
+model are kept as they are, so the kept words score exactly as before and a dropped word
+scores as an unknown one, with the add one smoothed probability of a count of 0.
+
+Run `python compact_model.py convert` to convert the `pos.dat`/`neg.dat` pickles (e.g.
+`convert --min-count 2 --top-k 20000 --log-prob-bits 16`) and
+`python compact_model.py bench` to compare load times of the two formats.
+"""
+import argparse, math, mmap, os, pickle, struct, sys, time, tracemalloc, zlib
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+MAGIC = b"NBCM"
+VERSION = 2
+_HEADER = struct.Struct("<4sIIIQQccxxxxxxdd")
+# version 1 files (float64 log probabilities and uint32 counts) are still read
+_HEADER_V1 = struct.Struct("<4sIIIQQ")
+_MAGIC_VERSION = struct.Struct("<4sI")
+# struct / memoryview type of the log_probs section by bits per log probability
+LOG_PROB_TYPES = {64: b"d", 16: b"H", 8: b"B"}
+
+
+def _align(offset: int) -> int:
+    """Rounds given offset up to the next multiple of 8"""
+    return (offset + 7) & ~7
+
+
+def _layout(
+    num_words: int,
+    num_slots: int,
+    log_prob_type: bytes,
+    count_type: bytes,
+    header_size: int = _HEADER.size,
+) -> Tuple[int, int, int, int, int, int]:
+    """Computes the start of each section of a compact model file
+
+    Args:
+        num_words - number of words in the vocabulary
+        num_slots - number of slots of the hash table
+        log_prob_type - struct type of a log probability
+        count_type - struct type of a count
+        header_size - size of the header of the file's version
+
+    Returns:
+        offsets of the log_probs, pos_counts, neg_counts, offsets, slots and strings
+        sections
+    """
+    log_prob_size = struct.calcsize(log_prob_type.decode())
+    count_size = struct.calcsize(count_type.decode())
+    log_probs = _align(header_size)
+    pos_counts = _align(log_probs + 2 * log_prob_size * num_words)
+    neg_counts = _align(pos_counts + count_size * num_words)
+    offsets = _align(neg_counts + count_size * num_words)
+    slots = _align(offsets + 4 * (num_words + 1))
+    strings = _align(slots + 4 * num_slots)
+    return log_probs, pos_counts, neg_counts, offsets, slots, strings
+
+
+def informativeness(pos_count: int, neg_count: int) -> float:
+    """How much the log likelihood ratio of the training data changes if a word is
+    dropped and scores as an unknown word instead: the difference of the word's
+    log-odds between the classes and the unknown word's, weighted by how often it occurs
+
+    With add one smoothing that difference is log((pos_count + 1) / (neg_count + 1)),
+    the class totals cancel out. Ranking by the plain log-odds instead would drop
+    frequent neutral words, which then score as unknown words, and those lean towards
+    the class with fewer words.
+
+    Args:
+        pos_count - frequency of the word in positive reviews
+        neg_count - frequency of the word in negative reviews
+
+    Returns:
+        score to rank words by, higher is more informative
+    """
+    return (pos_count + neg_count) * abs(math.log((pos_count + 1) / (neg_count + 1)))
+
+
+def parse_top_k(value: str) -> Optional[int]:
+    """Parses the number of words to keep given on a command line, as used by both
+    `compact_model.py` and `compaction_report.py`
+
+    Args:
+        value - a number of words, or "all" to keep every word
+
+    Returns:
+        top_k for `prune`, None for "all"
+    """
+    if value == "all":
+        return None
+    top_k = int(value)
+    if top_k < 0:
+        raise ValueError(f"top_k must not be negative, got {top_k}")
+    return top_k
+
+
+def prune(
+    pos_freqs: Mapping[str, int],
+    neg_freqs: Mapping[str, int],
+    min_count: int = 1,
+    top_k: Optional[int] = None,
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Drops rare and uninformative words from given frequency dictionaries
+
+    Args:
+        pos_freqs - dictionary of frequencies of positive words
+        neg_freqs - dictionary of frequencies of negative words
+        min_count - words seen fewer times than this in both classes together are
+            dropped
+        top_k - only this many words with the highest `informativeness` are kept, or
+            all of them if None (0 keeps none, see `parse_top_k`)
+
+    Returns:
+        pruned (positive, negative) dictionaries of frequencies
+    """
+    if min_count < 1:
+        raise ValueError(f"min_count must be positive, got {min_count}")
+    if top_k is not None and top_k < 0:
+        raise ValueError(f"top_k must not be negative, got {top_k}")
+
+    words = [
+        word
+        for word in pos_freqs.keys() | neg_freqs.keys()
+        if pos_freqs.get(word, 0) + neg_freqs.get(word, 0) >= min_count
+    ]
+    if top_k is not None and top_k < len(words):
+        # sorted first so ties are broken the same way on every run
+        words.sort()
+        words.sort(
+            key=lambda word: informativeness(pos_freqs.get(word, 0), neg_freqs.get(word, 0)),
+            reverse=True,
+        )
+        words = words[:top_k]
+
+    kept = set(words)
+    return (
+        {word: count for word, count in pos_freqs.items() if word in kept},
+        {word: count for word, count in neg_freqs.items() if word in kept},
+    )
+
+
+def _quantize(log_probs: list, bits: int) -> Tuple[list, float, float]:
+    """Maps log probabilities evenly onto the unsigned integers of given width
+
+    Args:
+        log_probs - log probabilities to quantize
+        bits - bits per quantized value
+
+    Returns:
+        quantized values, and the scale and minimum to restore them with as
+        minimum + scale * value
+    """
+    minimum = min(log_probs, default=0.0)
+    maximum = max(log_probs, default=0.0)
+    scale = (maximum - minimum) / ((1 << bits) - 1) or 1.0
+    return [round((log_prob - minimum) / scale) for log_prob in log_probs], scale, minimum
+
+
+def write_compact_model(
+    pos_freqs: Mapping[str, int],
+    neg_freqs: Mapping[str, int],
+    filepath: str,
+    num_pos_words: Optional[int] = None,
+    num_neg_words: Optional[int] = None,
+    log_prob_bits: int = 64,
+) -> None:
+    """Writes given frequency dictionaries to a compact model file
+
+    Args:
+        pos_freqs - dictionary of frequencies of positive words
+        neg_freqs - dictionary of frequencies of negative words
+        filepath - relative path to file to save
+        num_pos_words - total count of words in positive reviews, defaults to the sum of
+            `pos_freqs` (given when they were pruned, see `prune`)
+        num_neg_words - total count of words in negative reviews, see `num_pos_words`
+        log_prob_bits - bits per stored log probability, 64 for exact float64 or 16 / 8
+            to quantize them
+    """
+    if log_prob_bits not in LOG_PROB_TYPES:
+        raise ValueError(
+            f"log_prob_bits must be one of {sorted(LOG_PROB_TYPES)}, got {log_prob_bits}"
+        )
+    if num_pos_words is None:
+        num_pos_words = sum(pos_freqs.values())
+    if num_neg_words is None:
+        num_neg_words = sum(neg_freqs.values())
+    words = sorted(pos_freqs.keys() | neg_freqs.keys())
+    encoded = [word.encode("utf8") for word in words]
+
+    # keep the hash table at most half full so probe sequences stay short
+    num_slots = 1
+    while num_slots < 2 * len(words):
+        num_slots *= 2
+    slots = [-1] * num_slots
+    for word_id, word in enumerate(encoded):
+        slot = zlib.crc32(word) & (num_slots - 1)
+        while slots[slot] != -1:
+            slot = (slot + 1) & (num_slots - 1)
+        slots[slot] = word_id
+
+    log_probs = []
+    pos_counts = []
+    neg_counts = []
+    for word in words:
+        pos_count = pos_freqs.get(word, 0)
+        neg_count = neg_freqs.get(word, 0)
+        pos_counts.append(pos_count)
+        neg_counts.append(neg_count)
+        # computed exactly like BayesClassifier.build_index so scores are identical
+        log_probs.append(math.log((pos_count + 1) / num_pos_words))
+        log_probs.append(math.log((neg_count + 1) / num_neg_words))
+
+    offsets = [0]
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+
+    log_prob_type = LOG_PROB_TYPES[log_prob_bits]
+    scale = minimum = 0.0
+    if log_prob_bits != 64:
+        log_probs, scale, minimum = _quantize(log_probs, log_prob_bits)
+    largest_count = max(pos_counts + neg_counts, default=0)
+    count_type = b"B" if largest_count < 1 << 8 else b"H" if largest_count < 1 << 16 else b"I"
+
+    sections = _layout(len(words), num_slots, log_prob_type, count_type)
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        len(words),
+        num_slots,
+        num_pos_words,
+        num_neg_words,
+        log_prob_type,
+        count_type,
+        scale,
+        minimum,
+    )
+    with open(filepath, "wb") as f:
+        f.write(header)
+        for start, data in zip(
+            sections,
+            (
+                struct.pack(f"<{len(log_probs)}{log_prob_type.decode()}", *log_probs),
+                struct.pack(f"<{len(words)}{count_type.decode()}", *pos_counts),
+                struct.pack(f"<{len(words)}{count_type.decode()}", *neg_counts),
+                struct.pack(f"<{len(offsets)}I", *offsets),
+                struct.pack(f"<{num_slots}i", *slots),
+                b"".join(encoded),
+            ),
+        ):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(data)
+
+
+class CompactModel(Mapping[str, Tuple[float, float]]):
+    """A compact model file mapped into memory
+
+    The model is a read only mapping of (word -> (positive, negative) log probability),
+    so it can stand in for the scoring index of a BayesClassifier.
+
+    Attributes:
+        num_pos_words - total count of words in positive reviews
+        num_neg_words - total count of words in negative reviews
+        unseen_log_probs - (positive, negative) log probability of unknown words
+        pos_freqs - read only dictionary of frequencies of positive words
+        neg_freqs - read only dictionary of frequencies of negative words
+    """
+
+    def __init__(self, filepath: str):
+        """Maps given compact model file into memory
+
+        Args:
+            filepath - relative path to file to load
+        """
+        if sys.byteorder != "little":
+            raise ValueError("compact models can only be mapped on little endian machines")
+        with open(filepath, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = _MAGIC_VERSION.unpack_from(self._buffer)
+        if magic != MAGIC or version not in (1, VERSION):
+            self._buffer.close()
+            raise ValueError(
+                f"{filepath} is not a version 1 or {VERSION} compact model, convert "
+                f"pos.dat/neg.dat again with `python compact_model.py convert`"
+            )
+        if version == 1:
+            _, __, num_words, num_slots, num_pos, num_neg = _HEADER_V1.unpack_from(
+                self._buffer
+            )
+            log_prob_type, count_type, scale, minimum = b"d", b"I", 0.0, 0.0
+            header_size = _HEADER_V1.size
+        else:
+            (
+                _,
+                __,
+                num_words,
+                num_slots,
+                num_pos,
+                num_neg,
+                log_prob_type,
+                count_type,
+                scale,
+                minimum,
+            ) = _HEADER.unpack_from(self._buffer)
+            header_size = _HEADER.size
+
+        self._num_words = num_words
+        self._mask = num_slots - 1
+        # 0 for float64 log probabilities, which are used as they are
+        self._scale = scale
+        self._minimum = minimum
+        self.num_pos_words: int = num_pos
+        self.num_neg_words: int = num_neg
+        self.unseen_log_probs: Tuple[float, float] = (
+            math.log(1 / num_pos),
+            math.log(1 / num_neg),
+        )
+
+        view = self._view = memoryview(self._buffer)
+        log_probs, pos_counts, neg_counts, offsets, slots, strings = _layout(
+            num_words, num_slots, log_prob_type, count_type, header_size
+        )
+        self._log_probs = view[log_probs:pos_counts].cast(log_prob_type.decode())[
+            : 2 * num_words
+        ]
+        self._pos_counts = view[pos_counts:neg_counts].cast(count_type.decode())[
+            :num_words
+        ]
+        self._neg_counts = view[neg_counts:offsets].cast(count_type.decode())[:num_words]
+        self._offsets = view[offsets : offsets + 4 * (num_words + 1)].cast("I")
+        self._slots = view[slots : slots + 4 * num_slots].cast("i")
+        self._strings = strings
+
+        self.pos_freqs = CompactCounts(self, self._pos_counts)
+        self.neg_freqs = CompactCounts(self, self._neg_counts)
+
+    def word_id(self, word: str) -> int:
+        """Finds the id of given word in the hash table
+
+        Args:
+            word - word to look up
+
+        Returns:
+            index of the word in the model's arrays, or -1 if it is unknown
+        """
+        encoded = word.encode("utf8")
+        slot = zlib.crc32(encoded) & self._mask
+        while True:
+            word_id = self._slots[slot]
+            if word_id == -1:
+                return -1
+            start = self._strings + self._offsets[word_id]
+            end = self._strings + self._offsets[word_id + 1]
+            if self._buffer[start:end] == encoded:
+                return word_id
+            slot = (slot + 1) & self._mask
+
+    def word(self, word_id: int) -> str:
+        """Decodes the word with given id
+
+        Args:
+            word_id - index of the word in the model's arrays
+
+        Returns:
+            the word
+        """
+        start = self._strings + self._offsets[word_id]
+        end = self._strings + self._offsets[word_id + 1]
+        return self._buffer[start:end].decode("utf8")
+
+    def get(self, word: str, default=None):
+        word_id = self.word_id(word)
+        if word_id == -1:
+            return default
+        if self._scale:
+            return (
+                self._minimum + self._scale * self._log_probs[2 * word_id],
+                self._minimum + self._scale * self._log_probs[2 * word_id + 1],
+            )
+        return self._log_probs[2 * word_id], self._log_probs[2 * word_id + 1]
+
+    def __getitem__(self, word: str) -> Tuple[float, float]:
+        log_probs = self.get(word)
+        if log_probs is None:
+            raise KeyError(word)
+        return log_probs
+
+    def __contains__(self, word) -> bool:
+        return isinstance(word, str) and self.word_id(word) != -1
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.word(word_id) for word_id in range(self._num_words))
+
+    def __len__(self) -> int:
+        return self._num_words
+
+    def close(self) -> None:
+        """Unmaps the model, which can't be used afterwards (it is otherwise only
+        unmapped once the garbage collector frees it and its `CompactCounts` views)"""
+        for view in (
+            self._log_probs,
+            self._pos_counts,
+            self._neg_counts,
+            self._offsets,
+            self._slots,
+            self._view,
+        ):
+            view.release()
+        self._buffer.close()
+
+
+class CompactCounts(Mapping[str, int]):
+    """Read only (word -> frequency) dictionary of one class of a CompactModel, only
+    holding the words that occurred in that class like the dictionary it replaces"""
+
+    def __init__(self, model: CompactModel, counts: memoryview):
+        self._model = model
+        self._counts = counts
+
+    def __getitem__(self, word: str) -> int:
+        word_id = self._model.word_id(word) if isinstance(word, str) else -1
+        if word_id == -1 or self._counts[word_id] == 0:
+            raise KeyError(word)
+        return self._counts[word_id]
+
+    def __contains__(self, word) -> bool:
+        word_id = self._model.word_id(word) if isinstance(word, str) else -1
+        return word_id != -1 and self._counts[word_id] != 0
+
+    def __iter__(self) -> Iterator[str]:
+        for word_id, count in enumerate(self._counts):
+            if count:
+                yield self._model.word(word_id)
+
+    def __len__(self) -> int:
+        return sum(1 for count in self._counts if count)
+
+
+def compact(
+    pos_freqs: Mapping[str, int],
+    neg_freqs: Mapping[str, int],
+    filepath: str,
+    min_count: int = 1,
+    top_k: Optional[int] = None,
+    log_prob_bits: int = 64,
+) -> int:
+    """Prunes given frequency dictionaries and writes them to a compact model file,
+    keeping the totals of the full model so kept words score as before and dropped
+    words score as unknown ones
+
+    Args:
+        pos_freqs - dictionary of frequencies of positive words
+        neg_freqs - dictionary of frequencies of negative words
+        filepath - relative path to file to save
+        min_count - see `prune`
+        top_k - see `prune`
+        log_prob_bits - see `write_compact_model`
+
+    Returns:
+        number of words kept
+    """
+    pruned_pos, pruned_neg = prune(pos_freqs, neg_freqs, min_count, top_k)
+    write_compact_model(
+        pruned_pos,
+        pruned_neg,
+        filepath,
+        sum(pos_freqs.values()),
+        sum(neg_freqs.values()),
+        log_prob_bits,
+    )
+    return len(pruned_pos.keys() | pruned_neg.keys())
+
+
+def convert(
+    pos_filename: str,
+    neg_filename: str,
+    filepath: str,
+    min_count: int = 1,
+    top_k: Optional[int] = None,
+    log_prob_bits: int = 64,
+) -> int:
+    """Converts pickled pos/neg frequency dictionaries to a compact model file
+
+    Args:
+        pos_filename - relative path to pickled positive dictionary
+        neg_filename - relative path to pickled negative dictionary
+        filepath - relative path to compact model file to save
+        min_count - see `prune`
+        top_k - see `prune`
+        log_prob_bits - see `write_compact_model`
+
+    Returns:
+        number of words kept
+    """
+    with open(pos_filename, "rb") as f:
+        pos_freqs: Dict[str, int] = pickle.load(f)
+    with open(neg_filename, "rb") as f:
+        neg_freqs: Dict[str, int] = pickle.load(f)
+    return compact(pos_freqs, neg_freqs, filepath, min_count, top_k, log_prob_bits)
+
+
+def bench(
+    pos_filename: str, neg_filename: str, filepath: str, repeat: int
+) -> Dict[str, float]:
+    """Compares how long it takes to get a ready to score model from the pickles
+    (unpickling both dictionaries and building the scoring index) and from a compact
+    model file (mapping it), and how much Python memory each allocates
+
+    Args:
+        pos_filename - relative path to pickled positive dictionary
+        neg_filename - relative path to pickled negative dictionary
+        filepath - relative path to compact model file
+        repeat - number of loads to take the best time of
+
+    Returns:
+        dictionary of the best load time in ms and allocated KiB of each format
+    """
+
+    def load_pickles() -> object:
+        with open(pos_filename, "rb") as f:
+            pos_freqs = pickle.load(f)
+        with open(neg_filename, "rb") as f:
+            neg_freqs = pickle.load(f)
+        num_pos_words = sum(pos_freqs.values())
+        num_neg_words = sum(neg_freqs.values())
+        return {
+            word: (
+                math.log((pos_freqs.get(word, 0) + 1) / num_pos_words),
+                math.log((neg_freqs.get(word, 0) + 1) / num_neg_words),
+            )
+            for word in pos_freqs.keys() | neg_freqs.keys()
+        }
+
+    results = {}
+    for name, load in (("pickle", load_pickles), ("compact", lambda: CompactModel(filepath))):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model = load()
+            times.append(time.perf_counter() - start)
+            if isinstance(model, CompactModel):
+                model.close()
+        tracemalloc.start()
+        model = load()
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        if isinstance(model, CompactModel):
+            model.close()
+        del model
+        results[f"{name}_load_ms"] = min(times) * 1000
+        results[f"{name}_kib"] = allocated / 1024
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["convert", "bench"])
+    parser.add_argument("--pos", default="pos.dat", help="pickled positive dictionary")
+    parser.add_argument("--neg", default="neg.dat", help="pickled negative dictionary")
+    parser.add_argument("--model", default="model.bin", help="compact model file")
+    parser.add_argument("--repeat", type=int, default=20, help="loads to time")
+    parser.add_argument("--min-count", type=int, default=1, help="drop rarer words")
+    parser.add_argument(
+        "--top-k", type=parse_top_k, default=None,
+        help="keep this many most informative words, or all (the default)",
+    )
+    parser.add_argument(
+        "--log-prob-bits", type=int, default=64, choices=sorted(LOG_PROB_TYPES),
+        help="bits per stored log probability",
+    )
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        kept = convert(
+            args.pos, args.neg, args.model, args.min_count, args.top_k, args.log_prob_bits
+        )
+        print(f"Compact model of {kept} words saved to file: {args.model}")
+    else:
+        if not os.path.isfile(args.model):
+            sys.exit(f"{args.model} not found, run `convert` first")
+        for name, value in bench(args.pos, args.neg, args.model, args.repeat).items():
+            print(f"{name}: {value:.2f}")
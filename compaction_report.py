@@ -0,0 +1,178 @@
+"""Size, load time and classify latency versus accuracy of compacted models
+
+Every fifth review of `movie_reviews/` (in sorted order) is held out for testing and the
+rest is counted into one full model. That model is then compacted at every --level (see
+`compact_model.py`), each compacted model is mapped by a BayesClassifier and classifies
+the held out reviews. The first row is the full model loaded the usual way, from
+pickles with a scoring index built from them.
+
+    python compaction_report.py --level 1,all,64 --level 2,all,16 --level 1,20000,8
+"""
+import argparse, json, os, pickle, tempfile, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from a6 import BayesClassifier
+from compact_model import CompactModel, compact, parse_top_k
+from hashing_report import split_corpus
+
+# min_count, top_k (None keeps every word) and bits per log probability of each level
+DEFAULT_LEVELS: List[Tuple[int, Optional[int], int]] = [
+    (1, None, 64),
+    (1, None, 16),
+    (1, None, 8),
+    (2, None, 64),
+    (5, None, 64),
+    (1, 20000, 64),
+    (1, 10000, 16),
+    (1, 5000, 16),
+    (1, 2000, 8),
+    (5, 1000, 8),
+]
+
+
+def parse_level(level: str) -> Tuple[int, Optional[int], int]:
+    """Parses a compaction level given as min_count,top_k,bits, with top_k "all" to
+    keep every word (see `parse_top_k`)"""
+    min_count, top_k, bits = level.split(",")
+    return int(min_count), parse_top_k(top_k), int(bits)
+
+
+def count_training(corpus: str, training: List[str]) -> BayesClassifier:
+    """Counts the training files into the frequency dictionaries of a classifier
+
+    Args:
+        corpus - training directory
+        training - names of the training files
+
+    Returns:
+        classifier holding the counts, its scoring index is not built yet
+    """
+    classifier = BayesClassifier(pos_freqs={}, neg_freqs={})
+    for filename in training:
+        if filename.startswith(classifier.pos_file_prefix):
+            freqs = classifier.pos_freqs
+        elif filename.startswith(classifier.neg_file_prefix):
+            freqs = classifier.neg_freqs
+        else:
+            continue
+        text = classifier.load_file(os.path.join(corpus, filename))
+        classifier.update_dict(classifier.tokenize(text), freqs)
+    return classifier
+
+
+def close(classifier: BayesClassifier) -> None:
+    """Unmaps the compact model of given classifier, if it maps one, so the file can be
+    rewritten for the next level"""
+    if isinstance(classifier.log_probs, CompactModel):
+        classifier.log_probs.close()
+
+
+def evaluate(
+    load: Callable[[], BayesClassifier], held_out: List[Tuple[str, str]], repeat: int
+) -> Dict[str, float]:
+    """Loads a model and classifies the held out reviews with it one by one
+
+    Args:
+        load - function returning a classifier ready to classify
+        held_out - (text, label) of the held out reviews
+        repeat - number of loads to take the best time of
+
+    Returns:
+        dictionary of the best load time in ms, accuracy, and mean and p99 classify
+        latency in us
+    """
+    load_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        classifier = load()
+        load_times.append(time.perf_counter() - start)
+        close(classifier)
+    classifier = load()
+
+    latencies = []
+    correct = 0
+    for text, label in held_out:
+        start = time.perf_counter()
+        correct += classifier.classify(text) == label
+        latencies.append(time.perf_counter() - start)
+    close(classifier)
+    latencies.sort()
+    return {
+        "load_ms": min(load_times) * 1000,
+        "accuracy": correct / len(held_out),
+        "classify_mean_us": sum(latencies) / len(latencies) * 1e6,
+        "classify_p99_us": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        * 1e6,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    """Compacts the model at every level, evaluates it and reports the results"""
+    training, held_out = split_corpus(args.corpus)
+    full = count_training(args.corpus, training)
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as scratch:
+        pos_filename = os.path.join(scratch, "pos.dat")
+        neg_filename = os.path.join(scratch, "neg.dat")
+        full.save_dict(full.pos_freqs, pos_filename)
+        full.save_dict(full.neg_freqs, neg_filename)
+
+        def load_pickles() -> BayesClassifier:
+            with open(pos_filename, "rb") as f:
+                pos_freqs = pickle.load(f)
+            with open(neg_filename, "rb") as f:
+                neg_freqs = pickle.load(f)
+            classifier = BayesClassifier(pos_freqs=pos_freqs, neg_freqs=neg_freqs)
+            classifier.build_index()
+            return classifier
+
+        rows.append(
+            {
+                "model": "pickles",
+                "words": len(full.pos_freqs.keys() | full.neg_freqs.keys()),
+                "size_kib": (os.path.getsize(pos_filename) + os.path.getsize(neg_filename))
+                / 1024,
+                **evaluate(load_pickles, held_out, args.repeat),
+            }
+        )
+
+        for min_count, top_k, bits in args.level:
+            filepath = os.path.join(scratch, "model.bin")
+            words = compact(
+                full.pos_freqs, full.neg_freqs, filepath, min_count, top_k, bits
+            )
+            rows.append(
+                {
+                    "model": f"min={min_count} top={'all' if top_k is None else top_k} "
+                    f"bits={bits}",
+                    "words": words,
+                    "size_kib": os.path.getsize(filepath) / 1024,
+                    **evaluate(lambda: BayesClassifier(filepath), held_out, args.repeat),
+                }
+            )
+
+    print(f"{len(training)} training files, {len(held_out)} held out reviews")
+    print(f"{'model':<28} {'words':>7} {'size KiB':>9} {'load ms':>8} "
+          f"{'accuracy':>9} {'mean us':>8} {'p99 us':>8}")
+    for row in rows:
+        print(f"{row['model']:<28} {row['words']:>7} {row['size_kib']:>9.0f} "
+              f"{row['load_ms']:>8.2f} {row['accuracy']:>9.4f} "
+              f"{row['classify_mean_us']:>8.1f} {row['classify_p99_us']:>8.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="movie_reviews/", help="training directory")
+    parser.add_argument(
+        "--level", type=parse_level, action="append",
+        help="compaction level as min_count,top_k,bits (top_k all keeps every word), "
+        "may be repeated",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="loads to time")
+    parser.add_argument("--output", help="also write the rows as JSON here")
+    args = parser.parse_args()
+    args.level = args.level or DEFAULT_LEVELS
+    main(args)
@@ -0,0 +1,229 @@
+"""Packed, indexed archive of a training corpus
+
+Reading thousands of tiny review files costs a few syscalls each, which dominates
+training I/O (especially on network filesystems). A corpus archive holds all of them in
+one file that is `mmap`ed and read record by record instead. Layout (little endian):
+
+    header      magic, version, uint64 offset of the index, uint64 number of records
+    records     for every review: label (0 neither, 1 positive, 2 negative), length of
+                its name, length of its text, then the utf-8 encoded name and text
+    index       uint64 offset of every record
+
+New reviews are appended after the end of the file, followed by a new index of all
+records. Only once those are flushed to disk is the header pointed at the new index, so
+until then (even if the process or the machine dies part way) the archive reads as
+before. An append that fails is truncated away again, one cut short by a crash is left
+as unused bytes at the end, as is the old index.
+
+Version 1 archives, which kept the index offset and number of records in a trailer at
+the end of the file, can still be read but not appended to.
+
+    python corpus_archive.py pack movie_reviews/ reviews.nbca
+    python corpus_archive.py pack more_reviews/ reviews.nbca   # appends new reviews
+    python corpus_archive.py info reviews.nbca
+"""
+import argparse, mmap, os, struct
+from typing import Iterable, Iterator, Optional, Set, Tuple
+
+MAGIC = b"NBCA"
+VERSION = 2
+LABELS = (None, "positive", "negative")
+_HEADER = struct.Struct("<4sIQQ")
+_MAGIC_VERSION = struct.Struct("<4sI")
+_RECORD = struct.Struct("<BHI")
+_TRAILER_V1 = struct.Struct("<QQ4s")
+_INDEX_MAGIC_V1 = b"NBCI"
+
+# (name, "positive", "negative" or None, text) of a review
+Record = Tuple[str, Optional[str], str]
+
+
+class CorpusArchive:
+    """A corpus archive mapped into memory, a sequence of its records
+
+    Attributes:
+        version - format version of the archive, 1 or 2
+    """
+
+    def __init__(self, filepath: str):
+        """Maps given corpus archive into memory
+
+        Args:
+            filepath - relative path to archive to read
+        """
+        with open(filepath, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.version = _MAGIC_VERSION.unpack_from(self._buffer)
+        index_magic = _INDEX_MAGIC_V1
+        if self.version == VERSION:
+            _, __, index_offset, count = _HEADER.unpack_from(self._buffer)
+        elif self.version == 1:
+            index_offset, count, index_magic = _TRAILER_V1.unpack_from(
+                self._buffer, len(self._buffer) - _TRAILER_V1.size
+            )
+        if (magic, index_magic) != (MAGIC, _INDEX_MAGIC_V1) or self.version not in (
+            1,
+            VERSION,
+        ):
+            self._buffer.close()
+            raise ValueError(f"{filepath} is not a version 1 or {VERSION} corpus archive")
+        self._offsets = memoryview(self._buffer)[
+            index_offset : index_offset + 8 * count
+        ].cast("Q")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> Record:
+        """Decodes the record with given index
+
+        Args:
+            index - position of the record in the archive
+
+        Returns:
+            (name, label, text) of the review
+        """
+        offset = self._offsets[index]
+        label, name_length, text_length = _RECORD.unpack_from(self._buffer, offset)
+        start = offset + _RECORD.size
+        name = self._buffer[start : start + name_length].decode("utf8")
+        start += name_length
+        text = self._buffer[start : start + text_length].decode("utf8")
+        return name, LABELS[label], text
+
+    def __iter__(self) -> Iterator[Record]:
+        return (self[index] for index in range(len(self)))
+
+    def names(self) -> Set[str]:
+        """Names of all reviews in the archive"""
+        names = set()
+        for offset in self._offsets:
+            _, name_length, __ = _RECORD.unpack_from(self._buffer, offset)
+            start = offset + _RECORD.size
+            names.add(self._buffer[start : start + name_length].decode("utf8"))
+        return names
+
+    def close(self) -> None:
+        """Unmaps the archive"""
+        self._offsets.release()
+        self._buffer.close()
+
+
+def append_records(filepath: str, records: Iterable[Record]) -> int:
+    """Appends records to a corpus archive, creating it if it doesn't exist
+
+    Args:
+        filepath - relative path to archive
+        records - (name, label, text) of the reviews to add
+
+    Returns:
+        number of records appended
+    """
+    if not os.path.isfile(filepath):
+        # an empty archive, so a failed first append leaves a valid archive too
+        with open(filepath, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, _HEADER.size, 0))
+    archive = CorpusArchive(filepath)
+    offsets = archive._offsets.tolist()
+    version = archive.version
+    archive.close()
+    if version != VERSION:
+        raise ValueError(f"Can't append to version {version} corpus archive {filepath}, "
+                         "pack it again")
+
+    added = 0
+    with open(filepath, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        try:
+            for name, label, text in records:
+                encoded_name = name.encode("utf8")
+                encoded_text = text.encode("utf8")
+                offsets.append(f.tell())
+                f.write(
+                    _RECORD.pack(LABELS.index(label), len(encoded_name), len(encoded_text))
+                )
+                f.write(encoded_name)
+                f.write(encoded_text)
+                added += 1
+            if not added:
+                return 0
+
+            index_offset = f.tell()
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            # drop whatever was written, the header still points at the old index
+            f.truncate(end)
+            raise
+        # the records and index are on disk, so the header can point at them now
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, index_offset, len(offsets)))
+        f.flush()
+        os.fsync(f.fileno())
+    return added
+
+
+def pack(
+    directory: str, filepath: str, pos_prefix: str = "movies-5", neg_prefix: str = "movies-1"
+) -> Tuple[int, int]:
+    """Packs the reviews of a directory into a corpus archive, appending the ones that
+    aren't in it yet if it already exists
+
+    Args:
+        directory - directory of review files
+        filepath - relative path to archive
+        pos_prefix - prefix of positive reviews
+        neg_prefix - prefix of negative reviews
+
+    Returns:
+        number of reviews added and number skipped because they were already packed
+    """
+    packed: Set[str] = set()
+    if os.path.isfile(filepath):
+        archive = CorpusArchive(filepath)
+        packed = archive.names()
+        archive.close()
+
+    filenames = sorted(os.listdir(directory))
+    new = [filename for filename in filenames if filename not in packed]
+
+    def records() -> Iterator[Record]:
+        for filename in new:
+            label = None
+            if filename.startswith(pos_prefix):
+                label = "positive"
+            elif filename.startswith(neg_prefix):
+                label = "negative"
+            with open(os.path.join(directory, filename), "r", encoding="utf8") as f:
+                yield filename, label, f.read()
+
+    added = append_records(filepath, records())
+    return added, len(filenames) - len(new)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="pack (or append) a directory")
+    pack_parser.add_argument("directory", help="directory of review files")
+    pack_parser.add_argument("archive", help="archive to create or append to")
+    pack_parser.add_argument("--pos-prefix", default="movies-5")
+    pack_parser.add_argument("--neg-prefix", default="movies-1")
+    info_parser = subparsers.add_parser("info", help="summarize an archive")
+    info_parser.add_argument("archive", help="archive to summarize")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        added, skipped = pack(args.directory, args.archive, args.pos_prefix, args.neg_prefix)
+        print(f"Packed {added} reviews into {args.archive} ({skipped} already packed)")
+    else:
+        archive = CorpusArchive(args.archive)
+        labels = [label for _, label, __ in archive]
+        print(
+            f"{args.archive}: {len(archive)} reviews, {labels.count('positive')} "
+            f"positive, {labels.count('negative')} negative, "
+            f"{os.path.getsize(args.archive)} bytes"
+        )
+        archive.close()
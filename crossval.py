@@ -0,0 +1,225 @@
+"""K-fold cross-validation of the BayesClassifier on the bundled corpus
+
+Every review is read, tokenized and counted once. The model of each fold is then built
+by subtracting the counts of its held out reviews from the counts of the whole corpus
+instead of training again, which gives exactly the frequency dictionaries training on
+the other folds would, and the folds are scored in parallel.
+
+    python crossval.py --folds 10 --workers 4 --output crossval.json
+"""
+import argparse, json, multiprocessing, os, random, time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from a6 import BayesClassifier, _label_of
+
+LABELS = ("positive", "negative")
+
+# (label, tokens in order, dictionary of frequencies of the tokens) of a review
+Document = Tuple[str, List[str], Dict[str, int]]
+
+# set in every worker process by `_init_worker`, so the corpus is only sent once per
+# worker instead of once per fold
+_documents: List[Document] = []
+_folds: List[int] = []
+_pos_freqs: Dict[str, int] = {}
+_neg_freqs: Dict[str, int] = {}
+
+
+def count_corpus(
+    classifier: BayesClassifier,
+) -> Tuple[List[Document], Dict[str, int], Dict[str, int]]:
+    """Tokenizes and counts every positive and negative review of the classifier's
+    training directory
+
+    Args:
+        classifier - classifier giving the training directory, file prefixes and
+            tokenizer
+
+    Returns:
+        the documents in sorted file name order, and the positive and negative word
+        frequencies of the whole corpus
+    """
+    directory = classifier.training_data_directory
+    documents = []
+    for filename in sorted(os.listdir(directory)):
+        label = _label_of(filename, classifier.pos_file_prefix, classifier.neg_file_prefix)
+        if label is None:
+            continue
+        tokens = classifier.tokenize(classifier.load_file(os.path.join(directory, filename)))
+        documents.append((label, tokens, dict(Counter(tokens))))
+
+    pos_freqs: Dict[str, int] = {}
+    neg_freqs: Dict[str, int] = {}
+    for label, _, counts in documents:
+        classifier.merge_dict(counts, pos_freqs if label == "positive" else neg_freqs)
+    return documents, pos_freqs, neg_freqs
+
+
+def assign_folds(num_documents: int, num_folds: int, seed: int) -> List[int]:
+    """Deals documents into folds of (almost) equal size in a seeded random order
+
+    Returns:
+        fold of every document
+    """
+    order = list(range(num_documents))
+    random.Random(seed).shuffle(order)
+    folds = [0] * num_documents
+    for position, index in enumerate(order):
+        folds[index] = position % num_folds
+    return folds
+
+
+def _init_worker(
+    documents: List[Document],
+    folds: List[int],
+    pos_freqs: Dict[str, int],
+    neg_freqs: Dict[str, int],
+) -> None:
+    """Stores the counted corpus for `score_fold`"""
+    global _documents, _folds, _pos_freqs, _neg_freqs
+    _documents, _folds, _pos_freqs, _neg_freqs = documents, folds, pos_freqs, neg_freqs
+
+
+def score_fold(fold: int) -> Dict[str, Any]:
+    """Builds the model of given fold by count subtraction and classifies its held out
+    documents
+
+    Args:
+        fold - index of the fold
+
+    Returns:
+        dictionary of the fold's confusion matrix (true label -> predicted label ->
+        count) and the seconds spent building its model and scoring
+    """
+    start = time.perf_counter()
+    held_out = [index for index, document_fold in enumerate(_folds) if document_fold == fold]
+    classifier = BayesClassifier(pos_freqs=dict(_pos_freqs), neg_freqs=dict(_neg_freqs))
+    for index in held_out:
+        label, _, counts = _documents[index]
+        classifier.subtract_dict(
+            counts, classifier.pos_freqs if label == "positive" else classifier.neg_freqs
+        )
+    classifier.build_index()
+    built = time.perf_counter()
+
+    confusion = {truth: {predicted: 0 for predicted in LABELS} for truth in LABELS}
+    for index in held_out:
+        label, tokens, _ = _documents[index]
+        pos_prob, neg_prob = classifier.score(tokens)
+        confusion[label]["positive" if pos_prob > neg_prob else "negative"] += 1
+    return {
+        "fold": fold,
+        "confusion": confusion,
+        "build_s": built - start,
+        "score_s": time.perf_counter() - built,
+    }
+
+
+def summarize(confusion: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """Computes accuracy and per class precision and recall of a confusion matrix"""
+    total = sum(sum(row.values()) for row in confusion.values())
+    summary: Dict[str, Any] = {
+        "accuracy": sum(confusion[label][label] for label in LABELS) / total
+        if total
+        else 0.0
+    }
+    for label in LABELS:
+        predicted = sum(confusion[truth][label] for truth in LABELS)
+        actual = sum(confusion[label].values())
+        summary[f"{label}_precision"] = confusion[label][label] / predicted if predicted else 0.0
+        summary[f"{label}_recall"] = confusion[label][label] / actual if actual else 0.0
+    return summary
+
+
+def cross_validate(
+    num_folds: int, workers: int, seed: int, directory: Optional[str] = None
+) -> Dict[str, Any]:
+    """Runs k-fold cross-validation on the corpus
+
+    Args:
+        num_folds - number of folds
+        workers - number of worker processes scoring folds in parallel
+        seed - seed of the assignment of documents to folds
+        directory - training directory, defaults to the classifier's
+
+    Returns:
+        dictionary of overall metrics, confusion matrix, per fold results and the
+        seconds spent in each phase
+    """
+    if num_folds < 2:
+        raise ValueError(f"num_folds must be at least 2, got {num_folds}")
+
+    classifier = BayesClassifier(pos_freqs={}, neg_freqs={})
+    if directory is not None:
+        classifier.training_data_directory = directory
+
+    start = time.perf_counter()
+    documents, pos_freqs, neg_freqs = count_corpus(classifier)
+    # every fold needs a held out review to be scored on
+    if num_folds > len(documents):
+        raise ValueError(
+            f"num_folds must be at most the number of reviews, {len(documents)}, "
+            f"got {num_folds}"
+        )
+    folds = assign_folds(len(documents), num_folds, seed)
+    counted = time.perf_counter()
+
+    initargs = (documents, folds, pos_freqs, neg_freqs)
+    if workers > 1:
+        with multiprocessing.Pool(
+            min(workers, num_folds), initializer=_init_worker, initargs=initargs
+        ) as pool:
+            results = pool.map(score_fold, range(num_folds))
+    else:
+        _init_worker(*initargs)
+        results = [score_fold(fold) for fold in range(num_folds)]
+    scored = time.perf_counter()
+
+    confusion = {truth: {predicted: 0 for predicted in LABELS} for truth in LABELS}
+    for result in results:
+        for truth in LABELS:
+            for predicted in LABELS:
+                confusion[truth][predicted] += result["confusion"][truth][predicted]
+        result.update(summarize(result["confusion"]))
+    return {
+        "documents": len(documents),
+        "folds": num_folds,
+        **summarize(confusion),
+        "confusion": confusion,
+        "timings_s": {
+            "count": counted - start,
+            "folds": scored - counted,
+            "fold_build_total": sum(result["build_s"] for result in results),
+            "fold_score_total": sum(result["score_s"] for result in results),
+        },
+        "per_fold": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--folds", type=int, default=10, help="number of folds")
+    parser.add_argument("--workers", type=int, default=1, help="processes scoring folds")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the fold assignment")
+    parser.add_argument("--corpus", help="training directory")
+    parser.add_argument("--output", help="also write the full report as JSON here")
+    args = parser.parse_args()
+
+    report = cross_validate(args.folds, args.workers, args.seed, args.corpus)
+    print(f"{report['documents']} documents, {report['folds']} folds")
+    print(f"accuracy {report['accuracy']:.4f}")
+    for label in LABELS:
+        print(
+            f"{label:<8} precision {report[f'{label}_precision']:.4f} "
+            f"recall {report[f'{label}_recall']:.4f}"
+        )
+    print("confusion (rows true, columns predicted)")
+    print(f"{'':>10}" + "".join(f"{label:>10}" for label in LABELS))
+    for truth in LABELS:
+        print(f"{truth:>10}" + "".join(f"{report['confusion'][truth][p]:>10}" for p in LABELS))
+    for phase, seconds in report["timings_s"].items():
+        print(f"{phase:<16} {seconds:.3f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
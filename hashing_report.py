@@ -0,0 +1,133 @@
+"""Accuracy of the hashed feature space versus table size on the bundled corpus
+
+Every fifth review of `movie_reviews/` (in sorted order) is held out for testing and the
+rest is used for training. The exact dictionary BayesClassifier and a
+HashedBayesClassifier for every combination of --bits and --ngrams are trained on the
+same reviews (in a scratch directory, the cached models are left as they are) and then
+classify the held out ones.
+
+    python hashing_report.py --bits 12 16 20 --ngrams 1 2 --output report.json
+"""
+import argparse, json, os, tempfile, time
+from typing import Any, Dict, List, Tuple
+
+from a6 import BayesClassifier, HashedBayesClassifier
+
+
+def split_corpus(directory: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Splits the corpus into training files and held out (text, label) pairs
+
+    Args:
+        directory - training directory
+
+    Returns:
+        names of the training files and the held out reviews
+    """
+    training, held_out = [], []
+    for index, filename in enumerate(sorted(os.listdir(directory))):
+        if index % 5 != 4:
+            training.append(filename)
+            continue
+        if filename.startswith("movies-5"):
+            label = "positive"
+        elif filename.startswith("movies-1"):
+            label = "negative"
+        else:
+            continue
+        with open(os.path.join(directory, filename), "r", encoding="utf8") as f:
+            held_out.append((f.read(), label))
+    return training, held_out
+
+
+def evaluate(classifier: Any, held_out: List[Tuple[str, str]]) -> Dict[str, float]:
+    """Classifies the held out reviews
+
+    Returns:
+        dictionary of accuracy and mean classify latency in us
+    """
+    start = time.perf_counter()
+    labels, _ = classifier.classify_many(text for text, _ in held_out)
+    seconds = time.perf_counter() - start
+    correct = sum(label == truth for label, (_, truth) in zip(labels, held_out))
+    return {
+        "accuracy": correct / len(held_out),
+        "classify_us": seconds / len(held_out) * 1e6,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    """Trains and evaluates every configuration and reports them"""
+    corpus = os.path.abspath(args.corpus)
+    training, held_out = split_corpus(corpus)
+    rows = []
+    with tempfile.TemporaryDirectory() as scratch:
+        os.mkdir(os.path.join(scratch, "movie_reviews"))
+        for filename in training:
+            os.symlink(
+                os.path.join(corpus, filename),
+                os.path.join(scratch, "movie_reviews", filename),
+            )
+        # the classifiers train on (and cache their counts in) the current directory,
+        # so it is switched to the scratch directory while they are built
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            start = time.perf_counter()
+            exact = BayesClassifier()
+            train_seconds = time.perf_counter() - start
+            rows.append(
+                {
+                    "model": "exact",
+                    "entries": len(exact.pos_freqs) + len(exact.neg_freqs),
+                    "table_kib": None,
+                    "train_s": train_seconds,
+                    **evaluate(exact, held_out),
+                }
+            )
+
+            for ngram in args.ngrams:
+                for bits in args.bits:
+                    start = time.perf_counter()
+                    hashed = HashedBayesClassifier(bits, ngram)
+                    train_seconds = time.perf_counter() - start
+                    # two uint32 count arrays and two float64 log probability arrays
+                    table_bytes = hashed.num_buckets * (4 + 4 + 8 + 8)
+                    rows.append(
+                        {
+                            "model": f"hashed bits={bits} ngram={ngram}",
+                            "entries": 2 * hashed.num_buckets,
+                            "table_kib": table_bytes / 1024,
+                            "train_s": train_seconds,
+                            **evaluate(hashed, held_out),
+                        }
+                    )
+        finally:
+            os.chdir(cwd)
+
+    print(f"{len(training)} training files, {len(held_out)} held out reviews")
+    print(f"{'model':<26} {'entries':>9} {'table KiB':>10} {'train s':>8} "
+          f"{'accuracy':>9} {'classify us':>12}")
+    for row in rows:
+        table = "-" if row["table_kib"] is None else f"{row['table_kib']:.0f}"
+        print(f"{row['model']:<26} {row['entries']:>9} {table:>10} "
+              f"{row['train_s']:>8.2f} {row['accuracy']:>9.4f} {row['classify_us']:>12.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="movie_reviews/", help="training directory")
+    parser.add_argument(
+        "--bits", type=int, nargs="+", default=[10, 12, 14, 16, 18, 20],
+        help="log2 table sizes to evaluate",
+    )
+    parser.add_argument(
+        "--ngrams", type=int, nargs="+", default=[1, 2], help="n-gram lengths to evaluate"
+    )
+    parser.add_argument("--output", help="also write the rows as JSON here")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    main(args)
@@ -0,0 +1,480 @@
+"""Long running local classification service
+
+Loads a BayesClassifier once and serves it concurrently with asyncio. Requests that
+arrive within a short window of each other are scored together as one micro-batch
+through `classify_many`. The number of requests waiting to be scored is bounded: once
+it is reached HTTP requests are turned away with 503 (before their body is read) and the
+JSONL mode stops reading input until some of them are answered. The number of open HTTP
+connections, the size of request heads and bodies, and the length of JSONL lines are
+bounded too, so memory stays bounded under overload.
+
+    python service.py --http 127.0.0.1:8080
+    python service.py --unix /tmp/sentiment.sock
+    python service.py --jsonl < requests.jsonl > responses.jsonl
+
+Over HTTP (on localhost or a Unix socket), `POST /classify` with a body of
+`{"text": "..."}` answers `{"label": "positive", "scores": [pos, neg]}` and
+`GET /stats` answers request counts, throughput and p50/p99 latency. In JSONL mode every
+input line is such a request (optionally with an "id" that is echoed back), answers are
+written in input order and the stats are printed to stderr at the end of the input.
+"""
+import argparse, asyncio, contextlib, json, logging, sys, time
+from collections import deque
+from http import HTTPStatus
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from a6 import BayesClassifier
+
+
+class ServiceOverloaded(Exception):
+    """Raised when a request arrives while the queue of pending requests is full"""
+
+
+class ClassificationService:
+    """Micro-batching asyncio front end of a BayesClassifier
+
+    Attributes:
+        classifier - classifier requests are scored with
+        max_batch_size - maximum number of requests scored together
+        batch_window - seconds to wait for more requests after the first one of a batch
+        max_pending - maximum number of requests waiting to be scored
+        max_body_bytes - maximum size of an HTTP request body
+        max_header_bytes - maximum size of the request line and headers of an HTTP
+            request
+        max_connections - maximum number of HTTP connections served at once, more are
+            answered with 503 and closed
+    """
+
+    def __init__(
+        self,
+        classifier: BayesClassifier,
+        max_batch_size: int = 64,
+        batch_window: float = 0.002,
+        max_pending: int = 1024,
+        max_body_bytes: int = 1 << 20,
+        max_header_bytes: int = 1 << 14,
+        max_connections: int = 256,
+    ):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.max_body_bytes = max_body_bytes
+        self.max_header_bytes = max_header_bytes
+        self.max_connections = max_connections
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._connections: Optional[asyncio.Semaphore] = None
+        self._batcher: Optional[asyncio.Task] = None
+        # latencies of the most recent requests, enough for stable percentiles without
+        # growing forever
+        self._latencies: Deque[float] = deque(maxlen=10000)
+        self._started = time.perf_counter()
+        self._completed = 0
+        self._rejected = 0
+        self._batches = 0
+
+    async def start(self) -> None:
+        """Starts scoring queued requests, must be called from the running event loop"""
+        self._queue = asyncio.Queue(self.max_pending)
+        self._connections = asyncio.Semaphore(self.max_connections)
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        self._started = time.perf_counter()
+
+    async def stop(self) -> None:
+        """Stops scoring queued requests"""
+        if self._batcher is not None:
+            self._batcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._batcher
+
+    async def classify(self, text: str) -> Tuple[str, Tuple[float, float]]:
+        """Queues given text for the next micro-batch and waits for its result
+
+        Args:
+            text - text to classify
+
+        Returns:
+            (label, (positive, negative) log probability) of the text
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise ServiceOverloaded(f"{self.max_pending} requests already pending")
+        return await future
+
+    async def _run_batches(self) -> None:
+        """Takes requests off the queue in micro-batches and scores them"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                labels, scores = self.classifier.classify_many(
+                    [text for text, _, __ in batch]
+                )
+            except Exception as e:
+                for _, future, __ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            for (_, future, queued), label, score in zip(batch, labels, scores):
+                if not future.done():
+                    future.set_result((label, score))
+                self._latencies.append(finished - queued)
+            self._completed += len(batch)
+            self._batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarizes the requests served so far
+
+        Returns:
+            dictionary of request counts, throughput in requests per second and latency
+            percentiles in ms of the most recent requests
+        """
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        uptime = time.perf_counter() - self._started
+        return {
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "mean_batch_size": self._completed / self._batches if self._batches else 0,
+            "uptime_s": uptime,
+            "throughput_rps": self._completed / uptime if uptime else 0,
+            "latency_ms": {"p50": percentile(0.5), "p99": percentile(0.99)},
+        }
+
+    async def _answer(self, request: Any) -> Dict[str, Any]:
+        """Classifies a decoded JSON request of the form {"text": ..., "id": ...}
+
+        Args:
+            request - decoded request
+
+        Returns:
+            response to encode, either the result or an "error"
+        """
+        if not isinstance(request, dict) or not isinstance(request.get("text"), str):
+            return {"error": 'expected an object with a "text" string'}
+        label, scores = await self.classify(request["text"])
+        response: Dict[str, Any] = {"label": label, "scores": list(scores)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def _read_head(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Reads the request line and headers of an HTTP request
+
+        Args:
+            reader - stream of the connection
+
+        Returns:
+            the request line and the headers by lowercase name, or None at the end of
+            the stream
+
+        Raises:
+            ValueError if they are longer than `max_header_bytes` in total (or a line
+            is longer than the stream's buffer limit)
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        size = len(request_line)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            size += len(line)
+            if size > self.max_header_bytes:
+                raise ValueError(f"request header larger than {self.max_header_bytes} bytes")
+            if line in (b"\r\n", b"\n", b""):
+                return request_line, headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def handle_http(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serves the HTTP/1.1 requests of one (keep-alive) connection
+
+        Args:
+            reader - stream of the connection
+            writer - stream of the connection
+        """
+        if self._connections.locked():
+            self._rejected += 1
+            with contextlib.suppress(ConnectionError):
+                error = f"{self.max_connections} connections open"
+                await self._reject(reader, writer, 503, {"error": error})
+            writer.close()
+            return
+        async with self._connections:
+            await self._serve_connection(reader, writer)
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Does the work of `handle_http`
+
+        Args:
+            reader - stream of the connection
+            writer - stream of the connection
+        """
+        try:
+            while True:
+                # StreamReader.readline turns a line over its buffer limit into a
+                # ValueError too
+                try:
+                    head = await self._read_head(reader)
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self._reject(
+                        reader, writer, 431, {"error": "request header too large"}
+                    )
+                    break
+                if head is None:
+                    break
+                request_line, headers = head
+
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    await self._reject(
+                        reader, writer, 400, {"error": "malformed request"}
+                    )
+                    break
+                if length < 0:
+                    await self._reject(
+                        reader, writer, 400, {"error": "negative content length"}
+                    )
+                    break
+                # chunked bodies aren't supported, and their length can't be checked
+                # up front
+                if "transfer-encoding" in headers:
+                    error = "Transfer-Encoding is not supported"
+                    await self._reject(reader, writer, 501, {"error": error})
+                    break
+                if length > self.max_body_bytes:
+                    await self._reject(
+                        reader, writer, 413, {"error": "request too large"}
+                    )
+                    break
+                # don't read the body of a request that would be turned away anyway, the
+                # connection is closed as its body is left unread
+                if path == "/classify" and self._queue.full():
+                    self._rejected += 1
+                    error = f"{self.max_pending} requests already pending"
+                    await self._reject(reader, writer, 503, {"error": error})
+                    break
+                body = await reader.readexactly(length)
+
+                status, payload = await self._route(method, path, body)
+                await self._respond(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        """Dispatches one HTTP request
+
+        Args:
+            method - HTTP method of the request
+            path - path of the request
+            body - body of the request
+
+        Returns:
+            (HTTP status, response to encode)
+        """
+        if path == "/stats":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.stats()
+        if path != "/classify":
+            return 404, {"error": f"no such path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, {"error": "body is not valid JSON"}
+        try:
+            response = await self._answer(request)
+        except ServiceOverloaded as e:
+            return 503, {"error": str(e)}
+        return (400 if "error" in response else 200), response
+
+    async def _reject(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, status: int,
+        payload: Any,
+    ) -> None:
+        """Writes an error response to a request that may not have been read whole, then
+        discards whatever the client still sends for up to a second (in chunks, without
+        keeping it), as closing a socket with unread input resets the connection and the
+        client may lose the response
+
+        Args:
+            reader - stream of the connection
+            writer - stream of the connection
+            status - HTTP status
+            payload - response to encode
+        """
+        await self._respond(writer, status, payload)
+        if writer.can_write_eof():
+            writer.write_eof()
+
+        async def discard() -> None:
+            while await reader.read(1 << 16):
+                pass
+
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(discard(), 1)
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Any) -> None:
+        """Writes a JSON HTTP response
+
+        Args:
+            writer - stream of the connection
+            status - HTTP status
+            payload - response to encode
+        """
+        body = json.dumps(payload).encode("utf8")
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+
+    async def serve_jsonl(self) -> None:
+        """Answers one JSON request per line of stdin on stdout, in input order, until
+        the end of the input. Lines longer than `max_body_bytes` are answered with an
+        error without being read into memory whole."""
+        loop = asyncio.get_running_loop()
+        pending: Deque[asyncio.Future] = deque()
+
+        def read_line() -> Optional[bytes]:
+            """Reads a line of stdin, or returns None after skipping a too long one"""
+            line = sys.stdin.buffer.readline(self.max_body_bytes + 1)
+            if len(line) <= self.max_body_bytes or line.endswith(b"\n"):
+                return line
+            while line and not line.endswith(b"\n"):
+                line = sys.stdin.buffer.readline(1 << 16)
+            return None
+
+        def write_done() -> None:
+            while pending and pending[0].done():
+                sys.stdout.write(json.dumps(pending.popleft().result()) + "\n")
+            sys.stdout.flush()
+
+        async def answer_line(line: bytes) -> Dict[str, Any]:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                return {"error": "line is not valid JSON"}
+            return await self._answer(request)
+
+        while True:
+            # stdin may be a regular file, which can't be watched by the event loop, so
+            # it is read from a thread
+            line = await loop.run_in_executor(None, read_line)
+            if line is None:
+                too_long = loop.create_future()
+                too_long.set_result(
+                    {"error": f"line longer than {self.max_body_bytes} bytes"}
+                )
+                pending.append(too_long)
+                write_done()
+                continue
+            if not line:
+                break
+            if not line.strip():
+                continue
+            pending.append(asyncio.ensure_future(answer_line(line)))
+            # backpressure: don't read more input than can be queued
+            if len(pending) >= self.max_pending:
+                await pending[0]
+            write_done()
+
+        for future in list(pending):
+            await future
+        write_done()
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Loads the classifier and serves it in the mode given on the command line"""
+    classifier = BayesClassifier(args.model)
+    service = ClassificationService(
+        classifier,
+        max_batch_size=args.batch_size,
+        batch_window=args.batch_window_ms / 1000,
+        max_pending=args.max_pending,
+        max_connections=args.max_connections,
+    )
+    await service.start()
+    try:
+        if args.jsonl:
+            await service.serve_jsonl()
+            print(json.dumps(service.stats()), file=sys.stderr)
+            return
+
+        if args.unix:
+            server = await asyncio.start_unix_server(service.handle_http, args.unix)
+        else:
+            host, _, port = args.http.rpartition(":")
+            server = await asyncio.start_server(service.handle_http, host, int(port))
+        print(f"Serving on {args.unix or args.http}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--http", metavar="HOST:PORT", help="serve HTTP on a TCP port")
+    mode.add_argument("--unix", metavar="PATH", help="serve HTTP on a Unix socket")
+    mode.add_argument("--jsonl", action="store_true", help="answer stdin on stdout")
+    parser.add_argument("--model", help="compact model file to map instead of pos.dat/neg.dat")
+    parser.add_argument("--batch-size", type=int, default=64, help="max requests per batch")
+    parser.add_argument(
+        "--batch-window-ms", type=float, default=2, help="time to gather a batch"
+    )
+    parser.add_argument(
+        "--max-pending", type=int, default=1024, help="max requests waiting to be scored"
+    )
+    parser.add_argument(
+        "--max-connections", type=int, default=256, help="max HTTP connections served"
+    )
+    # logs go to stderr, in JSONL mode stdout only carries the responses
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(main(parser.parse_args()))